@@ -0,0 +1,94 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from utils import normalize_registration
+
+# How long a registration number is remembered as marked, and how many are
+# kept. Past either bound a repeat scan simply goes to storage again, which
+# still answers "already present" correctly.
+SCAN_DEDUP_TTL = int(os.environ.get('SCAN_DEDUP_TTL', 3600))
+SCAN_DEDUP_SIZE = int(os.environ.get('SCAN_DEDUP_SIZE', 20000))
+# Seconds between pre-warm attempts while storage is unreachable
+PREWARM_RETRY_INTERVAL = 60
+
+
+class ScanDedup:
+    """Process-wide TTL/LRU cache of registration numbers already marked
+
+    Shared by every browser session and kiosk in the process, so a repeat
+    scan of the same badge is answered without a round-trip to storage.
+    """
+
+    def __init__(self, ttl=SCAN_DEDUP_TTL, max_size=SCAN_DEDUP_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, registration_number):
+        """Return (True, name) if the number was marked recently, else (False, None)"""
+        key = normalize_registration(registration_number)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[0]
+
+    def add(self, registration_number, name=None):
+        key = normalize_registration(registration_number)
+        with self._lock:
+            self._entries[key] = (name, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def prewarm(self, records):
+        """Seed the cache with every Present row in ``records``"""
+        count = 0
+        for record in records:
+            if record.get('Status') == 'Present':
+                self.add(record.get('Registration_Number'), record.get('Name') or None)
+                count += 1
+        return count
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+scan_dedup = ScanDedup()
+_prewarmed = False
+_prewarm_attempted_at = None
+_prewarm_lock = threading.Lock()
+
+
+def get_dedup():
+    """Return the shared dedup cache, pre-warming it from storage on first use"""
+    global _prewarmed, _prewarm_attempted_at
+    with _prewarm_lock:
+        now = time.monotonic()
+        if not _prewarmed and (_prewarm_attempted_at is None or
+                               now - _prewarm_attempted_at >= PREWARM_RETRY_INTERVAL):
+            from storage import get_storage
+            _prewarm_attempted_at = now
+            try:
+                scan_dedup.prewarm(get_storage().list_participants())
+                _prewarmed = True
+            except Exception:
+                # Storage is unreachable; scans still work, just without the head start
+                pass
+    return scan_dedup
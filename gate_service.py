@@ -0,0 +1,259 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+# Cameras to run, as comma-separated gate=source pairs. A source is a camera
+# index, or a video file / frame directory for rehearsals:
+#   GATE_CAMERAS="north=0,south=1,vip=/data/vip.mp4"
+GATE_CAMERAS = os.environ.get('GATE_CAMERAS', '')
+
+# How often each worker reports its pipeline stats, and how the shared
+# marking queue is drained: up to MARK_BATCH scans, or whatever arrived
+# within MARK_INTERVAL seconds.
+GATE_STATS_INTERVAL = 1.0
+MARK_BATCH = 50
+MARK_INTERVAL = 0.2
+RECENT_SCANS = 50
+WORKER_RESTART_DELAY = 5
+
+
+def parse_gate_cameras(spec=GATE_CAMERAS):
+    """Parse "gate=source,..." into [(gate_id, source)]; sources are ints when numeric"""
+    gates = []
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        if '=' in item:
+            gate_id, source = (part.strip() for part in item.split('=', 1))
+        else:
+            gate_id, source = f"gate-{item}", item
+        if not gate_id or not source:
+            raise Exception(f"Invalid gate camera entry: {item}")
+        gates.append((gate_id, int(source) if source.isdigit() else source))
+    return gates
+
+
+def _gate_worker(gate_id, source, scans, stop):
+    """Capture/decode loop for one camera, run in its own process"""
+    from scanner import (open_camera, FrameSource, ScannerPipeline, RegionDecoder,
+                         AdaptivePreprocessor, CodeCooldown)
+    try:
+        cap = open_camera(source) if isinstance(source, int) else FrameSource(source)
+        if cap is None or not cap.isOpened():
+            raise Exception(f"Could not open camera {source}")
+        pipeline = ScannerPipeline(cap, region_decoder=RegionDecoder(),
+                                   preprocessor=AdaptivePreprocessor()).start()
+    except Exception as e:
+        scans.put(('error', gate_id, str(e)))
+        return
+
+    cooldown = CodeCooldown()
+    next_stats = 0.0
+    try:
+        while not stop.is_set():
+            results = pipeline.results()
+            captured_at = {}
+            for result in results:
+                # Monotonic clocks differ between processes; ship wall time
+                captured_at.setdefault(result['data'], time.time() - (time.monotonic() - result['captured_at']))
+            for code in cooldown.accept(results):
+                scans.put(('scan', gate_id, code, captured_at[code]))
+            if time.monotonic() >= next_stats:
+                scans.put(('stats', gate_id, pipeline.stats()))
+                next_stats = time.monotonic() + GATE_STATS_INTERVAL
+            if getattr(cap, 'exhausted', False):
+                break
+            time.sleep(0.02)
+    finally:
+        pipeline.stop()
+        scans.put(('stopped', gate_id, None))
+
+
+class GateService:
+    """One capture/decode process per gate camera, feeding one marking queue
+
+    Workers only capture, decode and apply the per-code cooldown; every
+    accepted scan comes back over a shared queue and is marked here in
+    batches, so storage sees one writer however many gates are running.
+    """
+
+    def __init__(self, gates=None):
+        self.gates = gates if gates is not None else parse_gate_cameras()
+        self._ctx = multiprocessing.get_context('spawn')
+        self._lock = threading.Lock()
+        self._scans = None
+        self._stop = None
+        self._processes = {}
+        self._thread = None
+        self.recent = deque(maxlen=RECENT_SCANS)
+        self.gate_stats = {}
+        self.last_error = None
+
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._lock:
+            if self.running():
+                return
+            if not self.gates:
+                raise Exception("No gate cameras configured; set GATE_CAMERAS")
+            self._scans = self._ctx.Queue()
+            self._stop = self._ctx.Event()
+            for gate_id, source in self.gates:
+                self.gate_stats[gate_id] = {
+                    'source': source, 'status': 'starting', 'pipeline': None,
+                    'scans': 0, 'marked': 0, 'already_present': 0, 'not_found': 0, 'queued': 0,
+                    'rejected': 0,
+                    'last_scan': None, 'started_at': time.time(), 'error': None
+                }
+                self._spawn(gate_id, source)
+            self._thread = threading.Thread(target=self._run, name="gate-marker", daemon=True)
+            self._thread.start()
+
+    def _spawn(self, gate_id, source):
+        process = self._ctx.Process(target=_gate_worker, args=(gate_id, source, self._scans, self._stop),
+                                    name=f"gate-{gate_id}", daemon=True)
+        process.start()
+        self._processes[gate_id] = process
+
+    def stop(self):
+        with self._lock:
+            if self._stop is None:
+                return
+            self._stop.set()
+            for process in self._processes.values():
+                process.join(timeout=3)
+                if process.is_alive():
+                    process.terminate()
+            self._processes = {}
+            if self._thread is not None:
+                self._thread.join(timeout=3)
+            self._thread = None
+            for stats in self.gate_stats.values():
+                stats['status'] = 'stopped'
+
+    def _handle(self, message, pending):
+        kind, gate_id, payload = message[0], message[1], message[2]
+        stats = self.gate_stats.get(gate_id)
+        if stats is None:
+            return
+        if kind == 'scan':
+            pending.append((gate_id, payload, message[3]))
+        elif kind == 'stats':
+            stats['pipeline'] = payload
+            stats['status'] = 'running'
+        elif kind == 'error':
+            stats['status'] = 'error'
+            stats['error'] = payload
+        elif kind == 'stopped' and stats['status'] != 'error':
+            stats['status'] = 'stopped'
+
+    def _mark(self, pending):
+        """Mark a batch of scans, one journal write per gate"""
+        from journal import record_scans
+        from scanner import parse_registration
+
+        by_gate = {}
+        for gate_id, code, captured_at in pending:
+            reg = parse_registration(code)
+            if reg is None:
+                # Forged, foreign or malformed badge: rejected before storage
+                self._count(gate_id, 'rejected', code, None, captured_at, time.time())
+                continue
+            by_gate.setdefault(gate_id, []).append((reg, captured_at))
+        for gate_id, scans in by_gate.items():
+            source = self.gate_stats[gate_id]['source']
+            results = record_scans([reg for reg, _ in scans], gate_id=gate_id, camera=source)
+            marked_at = time.time()
+            for (reg, captured_at), (result, name) in zip(scans, results):
+                self._count(gate_id, result, reg, name, captured_at, marked_at)
+
+    def _count(self, gate_id, result, reg, name, captured_at, marked_at):
+        stats = self.gate_stats[gate_id]
+        stats['scans'] += 1
+        stats[result] = stats.get(result, 0) + 1
+        stats['last_scan'] = marked_at
+        self.recent.appendleft({
+            'time': time.strftime('%H:%M:%S', time.localtime(marked_at)),
+            'gate': gate_id,
+            'registration': reg,
+            'name': name,
+            'result': result,
+            'latency_ms': (marked_at - captured_at) * 1000
+        })
+
+    def _run(self):
+        while not self._stop.is_set() or not self._scans.empty():
+            pending = []
+            deadline = time.monotonic() + MARK_INTERVAL
+            while len(pending) < MARK_BATCH:
+                try:
+                    message = self._scans.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                self._handle(message, pending)
+            if pending:
+                try:
+                    self._mark(pending)
+                    self.last_error = None
+                except Exception as e:
+                    self.last_error = str(e)
+            self._restart_dead_workers()
+
+    def _restart_dead_workers(self):
+        if self._stop.is_set():
+            return
+        for gate_id, process in list(self._processes.items()):
+            stats = self.gate_stats[gate_id]
+            if process.is_alive() or stats['status'] == 'stopped':
+                continue
+            # A crashed camera worker comes back after a short pause
+            if time.time() - stats.get('died_at', time.time()) >= WORKER_RESTART_DELAY:
+                stats.pop('died_at', None)
+                stats['status'] = 'starting'
+                self._spawn(gate_id, stats['source'])
+            else:
+                stats.setdefault('died_at', time.time())
+
+    def snapshot(self):
+        """Per-gate status and throughput for the monitoring page"""
+        now = time.time()
+        gates = []
+        for gate_id, stats in self.gate_stats.items():
+            pipeline = stats['pipeline'] or {}
+            elapsed_min = max((now - stats['started_at']) / 60, 1 / 60)
+            gates.append({
+                'gate': gate_id,
+                'source': stats['source'],
+                'status': stats['status'],
+                'capture_fps': pipeline.get('capture', {}).get('fps', 0.0),
+                'decode_fps': pipeline.get('decode', {}).get('fps', 0.0),
+                'scans': stats['scans'],
+                'scans_per_min': stats['scans'] / elapsed_min,
+                'marked': stats['marked'],
+                'already_present': stats['already_present'],
+                'not_found': stats['not_found'],
+                'queued': stats['queued'],
+                'rejected': stats['rejected'],
+                'last_scan': stats['last_scan'],
+                'error': stats['error']
+            })
+        return gates
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_gate_service():
+    """Return the process-wide gate service for the cameras in GATE_CAMERAS"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = GateService()
+        return _service
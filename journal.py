@@ -0,0 +1,277 @@
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from dedup import get_dedup
+from storage import get_storage
+
+JOURNAL_PATH = os.environ.get('SCAN_JOURNAL', 'scan_journal.jsonl')
+GATE_ID = os.environ.get('GATE_ID', socket.gethostname())
+
+# Replay cadence: how many journal entries are pushed per batch, how often
+# the worker looks for new ones, and the cap on its retry backoff.
+REPLAY_BATCH = 200
+REPLAY_INTERVAL = 1.0
+REPLAY_MAX_BACKOFF = 60
+
+
+class ScanJournal:
+    """Append-only, fsync'd log of every accepted scan
+
+    The byte offset of the last entry confirmed by storage is kept in a
+    sidecar ``.offset`` file, so a restart replays only what was not yet
+    confirmed.
+
+    Scans marked directly by the scanner are tracked in memory by entry id:
+    the replayer waits for entries whose direct mark is still running and
+    skips the ones it succeeded for, so only failed marks (and anything
+    left from before a restart) are replayed.
+    """
+
+    def __init__(self, path=JOURNAL_PATH):
+        self.path = path
+        self.offset_path = path + '.offset'
+        self.lock = threading.RLock()
+        self._file = open(path, 'ab')
+        # Ids are unique across restarts, so a new process never mistakes
+        # an old entry for one it marked itself
+        self._session = uuid.uuid4().hex[:8]
+        self._next_id = 0
+        self._in_flight = set()
+        self._marked = set()
+
+    def append(self, registration_number, gate_id=GATE_ID, camera=None, direct=False):
+        return self.append_many([registration_number], gate_id=gate_id, camera=camera, direct=direct)[0]
+
+    def append_many(self, registration_numbers, gate_id=GATE_ID, camera=None, direct=False):
+        """Journal several scans with a single fsync
+
+        With ``direct`` the caller marks the entries itself and must report
+        back through settle(); until then the replayer leaves them alone.
+        """
+        scanned_at = datetime.now().isoformat(timespec='seconds')
+        with self.lock:
+            entries = []
+            for registration_number in registration_numbers:
+                entries.append({
+                    'id': f"{self._session}-{self._next_id}",
+                    'reg': str(registration_number).strip(),
+                    'time': scanned_at,
+                    'gate': gate_id,
+                    'camera': camera
+                })
+                self._next_id += 1
+            data = b''.join((json.dumps(entry) + '\n').encode('utf-8') for entry in entries)
+            self._file.write(data)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            if direct:
+                self._in_flight.update(entry['id'] for entry in entries)
+        return entries
+
+    def settle(self, entries, marked):
+        """Report the outcome of a direct mark of ``entries``"""
+        with self.lock:
+            for entry in entries:
+                self._in_flight.discard(entry['id'])
+                if marked:
+                    self._marked.add(entry['id'])
+
+    def in_flight(self, entry):
+        with self.lock:
+            return entry.get('id') in self._in_flight
+
+    def was_marked(self, entry):
+        with self.lock:
+            return entry.get('id') in self._marked
+
+    def committed_offset(self):
+        try:
+            with open(self.offset_path, 'r') as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def pending(self, limit=REPLAY_BATCH, stop=None):
+        """Return ([entries], end_offset) for unconfirmed scans
+
+        Reading stops before the first entry for which ``stop(entry)`` is true.
+        """
+        entries = []
+        with self.lock, open(self.path, 'rb') as f:
+            offset = self.committed_offset()
+            f.seek(offset)
+            while len(entries) < limit:
+                line = f.readline()
+                if not line.endswith(b'\n'):
+                    # Empty read or a torn write from a crash; stop here
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    offset += len(line)
+                    continue
+                if stop is not None and stop(entry):
+                    break
+                offset += len(line)
+                entries.append(entry)
+        return entries, offset
+
+    def pending_count(self):
+        with self.lock, open(self.path, 'rb') as f:
+            f.seek(self.committed_offset())
+            return sum(1 for line in f if line.endswith(b'\n'))
+
+    def commit(self, offset, entries=()):
+        """Record that every entry before ``offset``, ``entries`` included, reached storage"""
+        with self.lock:
+            for entry in entries:
+                self._marked.discard(entry.get('id'))
+            # Everything is confirmed; start the journal over. The zero
+            # offset is made durable before the truncate, so a crash in
+            # between only replays entries again instead of skipping new ones.
+            restart = offset >= os.path.getsize(self.path)
+            self._write_offset(0 if restart else offset)
+            if restart:
+                self._file.truncate(0)
+                os.fsync(self._file.fileno())
+
+    def _write_offset(self, offset):
+        tmp_path = self.offset_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(str(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.offset_path)
+
+
+class JournalReplayer:
+    """Background worker that drains the journal into storage in batches"""
+
+    def __init__(self, journal, batch_size=REPLAY_BATCH, interval=REPLAY_INTERVAL,
+                 max_backoff=REPLAY_MAX_BACKOFF):
+        self.journal = journal
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self._thread = None
+        self._start_lock = threading.Lock()
+        # Serialises replays with each other only; scanners never wait on it
+        self._replay_lock = threading.Lock()
+        self.replayed_count = 0
+        self.last_error = None
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="journal-replay", daemon=True)
+                self._thread.start()
+
+    def replay_once(self):
+        """Push one batch of journal entries to storage; returns how many
+
+        The journal lock is only taken to read the batch and to move the
+        offset, so scans keep being journaled while storage is slow. The
+        batch ends before any scan whose direct mark is still running, and
+        scans that were marked directly are not marked again.
+        """
+        with self._replay_lock:
+            entries, end_offset = self.journal.pending(self.batch_size, stop=self.journal.in_flight)
+            if not entries:
+                return 0
+            storage = get_storage()
+            replay = [entry['reg'] for entry in entries if not self.journal.was_marked(entry)]
+            if replay:
+                storage.mark_present_many(replay)
+            # Only move the offset once storage has confirmed the writes,
+            # including the direct marks still in the write-behind queue
+            storage.flush()
+            self.journal.commit(end_offset, entries)
+            self.replayed_count += len(replay)
+            return len(entries)
+
+    def _run(self):
+        backoff = self.interval
+        while True:
+            try:
+                while self.replay_once():
+                    pass
+                self.last_error = None
+                backoff = self.interval
+                time.sleep(self.interval)
+            except Exception as e:
+                self.last_error = str(e)
+                backoff = min(backoff * 2, self.max_backoff)
+                time.sleep(backoff)
+
+
+_journal = None
+_replayer = None
+_journal_lock = threading.Lock()
+
+
+def get_journal():
+    """Return the process-wide scan journal, starting its replay worker"""
+    global _journal, _replayer
+    with _journal_lock:
+        if _journal is None:
+            _journal = ScanJournal()
+            _replayer = JournalReplayer(_journal)
+        _replayer.start()
+        return _journal
+
+
+def record_scan(registration_number, gate_id=GATE_ID, camera=None):
+    """Journal a scan, then mark it in storage
+
+    Returns the storage result, or ("queued", None) when storage could not be
+    reached; the replay worker will apply the scan once it is back.
+    """
+    return record_scans([registration_number], gate_id=gate_id, camera=camera)[0]
+
+
+def record_scans(registration_numbers, gate_id=GATE_ID, camera=None):
+    """Journal a batch of scans with one fsync, then mark them in storage
+
+    Numbers the shared dedup cache already knows are answered
+    "already_present" without touching the journal or storage; the rest are
+    marked with one mark_present_many call. Returns one result per
+    registration number, in order. If storage fails, the whole batch is
+    left to the replay worker.
+    """
+    dedup = get_dedup()
+    results = [None] * len(registration_numbers)
+    fresh = []
+    for i, registration_number in enumerate(registration_numbers):
+        seen, name = dedup.get(registration_number)
+        if seen:
+            results[i] = ("already_present", name)
+        else:
+            fresh.append(i)
+    if not fresh:
+        return results
+
+    # The journal lock covers only the append and fsync; marking happens
+    # outside it so a slow storage call never holds up other scanners
+    journal = get_journal()
+    entries = journal.append_many([registration_numbers[i] for i in fresh], gate_id=gate_id,
+                                  camera=camera, direct=True)
+    succeeded = False
+    try:
+        marked = get_storage().mark_present_many([registration_numbers[i] for i in fresh])
+        succeeded = True
+    except Exception:
+        marked = [("queued", None)] * len(fresh)
+    finally:
+        # Failed (or interrupted) marks are left to the replay worker
+        journal.settle(entries, marked=succeeded)
+    for i, result in zip(fresh, marked):
+        results[i] = result
+        # Only answers storage confirmed; a queued scan may turn out unregistered
+        if result[0] in ("marked", "already_present"):
+            dedup.add(registration_numbers[i], result[1])
+    return results
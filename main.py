@@ -3,7 +3,6 @@ from streamlit_option_menu import option_menu
 import base64
 import json
 import os
-from datetime import datetime
 
 st.set_page_config(
     page_title="QR Attendance System",
@@ -194,8 +193,8 @@ with st.sidebar:
     
     selected = option_menu(
         menu_title=None,  
-        options=["Home", "Mark Attendance", "Generate QR", "View Analysis"],
-        icons=["house-door-fill", "camera-fill", "qr-code-scan", "bar-chart-fill"],
+        options=["Home", "Mark Attendance", "Gate Monitor", "Generate QR", "View Analysis"],
+        icons=["house-door-fill", "camera-fill", "door-open-fill", "qr-code-scan", "bar-chart-fill"],
         menu_icon="cast",
         default_index=0,
         styles={
@@ -242,16 +241,18 @@ with st.sidebar:
     """, unsafe_allow_html=True)
     
     try:
-        if os.path.exists('encoded_creds.txt'):
-            from utils import get_google_sheet
-            sheet = get_google_sheet()
-            data = sheet.get_all_records()
+        from storage import STORAGE_BACKEND
+        if STORAGE_BACKEND != 'sheets' or os.path.exists('encoded_creds.txt'):
+            from stats import get_stats
+            from dedup import get_dedup
+            counts = get_stats()
+            # Load the Present rows into the shared scan dedup cache up front
+            get_dedup()
             
-            total = len(data)
-            present = len([row for row in data if row.get('Status', '').lower() == 'present'])
-            absent = total - present
-            scanned_today = len([row for row in data if 
-                                row.get('Timestamp', '').split()[0] == datetime.now().strftime('%Y-%m-%d')])
+            total = counts['total']
+            present = counts['present']
+            absent = counts['absent']
+            scanned_today = counts['scanned_today']
             
             stats = [
                 ("Total Participants", f"{total} 👥"),
@@ -286,7 +287,26 @@ with st.sidebar:
     
     st.markdown('</div>', unsafe_allow_html=True)
     
-    st.markdown("""
+    try:
+        # Starts the replay worker, which also drains scans left over from a previous run
+        from journal import get_journal
+        pending_scans = get_journal().pending_count()
+        sync_status = "🟢 Active" if pending_scans == 0 else f"🟡 {pending_scans} pending"
+    except Exception:
+        sync_status = "🔴 Unavailable"
+    
+    api_status = ""
+    if os.path.exists('encoded_creds.txt'):
+        from utils import get_quota_stats
+        quota = get_quota_stats()
+        api_status = f"""
+        <div class="stat-item">
+            <span class="stat-label">Sheets API Retries</span>
+            <span class="stat-value">{quota['retried']} 🔁 / {quota['throttled']} ⏳</span>
+        </div>
+        """
+    
+    st.markdown(f"""
     <div class="sidebar-stats">
         <h3>⚙️ System Status</h3>
         <div class="stat-item">
@@ -295,8 +315,9 @@ with st.sidebar:
         </div>
         <div class="stat-item">
             <span class="stat-label">Database Sync</span>
-            <span class="stat-value">🟢 Active</span>
+            <span class="stat-value">{sync_status}</span>
         </div>
+        {api_status}
         <div class="stat-item">
             <span class="stat-label">Last Updated</span>
             <span class="stat-value">Just Now</span>
@@ -336,6 +357,7 @@ if selected == "Home":
         This system allows you to:
         
         ✅ **Mark Attendance** - Scan QR codes to mark participants as present  
+        ✅ **Gate Monitor** - Run several entrance cameras at once and watch each gate's throughput  
         ✅ **Generate QR Codes** - Create unique QR codes for each participant  
         ✅ **View Analysis** - See attendance statistics and reports  
         
@@ -356,6 +378,9 @@ if selected == "Home":
 if selected == "Mark Attendance":
     from pages import Mark_Attendance
     Mark_Attendance.show()
+elif selected == "Gate Monitor":
+    from pages import Gate_Monitor
+    Gate_Monitor.show()
 elif selected == "Generate QR":
     from pages import Generate_QR
     Generate_QR.show()
@@ -0,0 +1,90 @@
+import streamlit as st
+import pandas as pd
+import time
+from datetime import datetime
+from gate_service import get_gate_service, parse_gate_cameras
+
+# How often the page redraws while live updates are on
+REFRESH_INTERVAL = 2
+
+
+def show():
+    st.markdown('<h1 class="main-header">🚪 Gate Monitor</h1>', unsafe_allow_html=True)
+
+    try:
+        gates = parse_gate_cameras()
+    except Exception as e:
+        st.error(f"❌ {str(e)}")
+        return
+
+    if not gates:
+        st.info("""
+        No gate cameras configured. Set `GATE_CAMERAS` before starting the app, for example:
+
+        `GATE_CAMERAS="north=0,south=1"`
+
+        Each camera then runs in its own worker process, and every scan is marked through one shared queue.
+        """)
+        return
+
+    service = get_gate_service()
+
+    col1, col2, col3 = st.columns([1, 1, 2])
+    with col1:
+        if st.button("▶️ Start Gates", key="start_gates", use_container_width=True,
+                     disabled=service.running()):
+            try:
+                service.start()
+                st.rerun()
+            except Exception as e:
+                st.error(f"❌ Could not start gates: {str(e)}")
+    with col2:
+        if st.button("⏹️ Stop Gates", key="stop_gates", use_container_width=True,
+                     disabled=not service.running()):
+            service.stop()
+            st.rerun()
+    with col3:
+        live = st.checkbox("🔄 Live updates", value=st.session_state.get('gate_monitor_live', True),
+                           key="gate_monitor_live")
+
+    snapshot = service.snapshot()
+    if not snapshot:
+        st.info(f"{len(gates)} gate camera(s) configured: "
+                + ", ".join(f"{gate_id} ({source})" for gate_id, source in gates)
+                + ". Click **Start Gates** to begin scanning.")
+        return
+
+    st.markdown("### 📊 Per-Gate Throughput")
+    metric_cols = st.columns(len(snapshot))
+    for col, gate in zip(metric_cols, snapshot):
+        status_icon = {"running": "🟢", "starting": "🟡", "error": "🔴"}.get(gate['status'], "⚪")
+        col.metric(f"{status_icon} {gate['gate']}", f"{gate['scans_per_min']:.1f}/min",
+                   f"{gate['decode_fps']:.0f} fps decoded")
+        if gate['error']:
+            col.caption(f"⚠️ {gate['error']}")
+
+    df = pd.DataFrame(snapshot)
+    df['last_scan'] = df['last_scan'].apply(
+        lambda t: datetime.fromtimestamp(t).strftime("%H:%M:%S") if t else "-"
+    )
+    st.dataframe(
+        df[['gate', 'source', 'status', 'capture_fps', 'decode_fps', 'scans', 'marked',
+            'already_present', 'not_found', 'queued', 'rejected', 'last_scan']].round(1),
+        use_container_width=True,
+        hide_index=True
+    )
+
+    if service.last_error:
+        st.warning(f"⚠️ Marking error: {service.last_error}. Scans are journaled and will be retried.")
+
+    st.markdown("### 🕒 Recent Scans")
+    if service.recent:
+        recent = pd.DataFrame(list(service.recent))
+        recent['latency_ms'] = recent['latency_ms'].round(0)
+        st.dataframe(recent, use_container_width=True, hide_index=True)
+    else:
+        st.info("No scans yet.")
+
+    if live and service.running():
+        time.sleep(REFRESH_INTERVAL)
+        st.rerun()
@@ -3,7 +3,9 @@ import qrcode
 from PIL import Image
 import io
 import base64
-from utils import get_google_sheet, check_duplicate
+from storage import get_storage
+from stats import get_stats
+from payload import make_payload, QR_SECRET, EVENT_ID
 import pandas as pd
 
 def show():
@@ -55,10 +57,10 @@ def show():
                     st.error("Please enter both name and registration number!")
                 else:
                     try:
-                        worksheet = get_google_sheet()
-                        is_duplicate, existing = check_duplicate(worksheet, reg_number)
+                        storage = get_storage()
+                        existing = storage.get_participant(reg_number)
                         
-                        if is_duplicate:
+                        if existing:
                             st.markdown(f"""
                             <div class="warning-message">
                             <h3>⚠️ Registration Number Already Exists!</h3>
@@ -68,7 +70,7 @@ def show():
                             """, unsafe_allow_html=True)
                         else:
                             # Add to Google Sheet
-                            worksheet.append_row([name, reg_number, "Absent"])
+                            storage.add_participant(name, reg_number)
                             
                             st.session_state.recently_added.append({
                                 'name': name,
@@ -76,7 +78,7 @@ def show():
                                 'time': pd.Timestamp.now().strftime("%H:%M:%S")
                             })
                             
-                            qr_data = f"{reg_number}_{name}"
+                            qr_data = make_payload(reg_number, name)
                             
                             # Generate QR code
                             img_bytes = generate_qr_code(qr_data, reg_number)
@@ -114,13 +116,30 @@ def show():
                     f"QR_{reg_number}_{name}.png"
                 ), unsafe_allow_html=True)
             
+            if QR_SECRET:
+                st.markdown(f"""
+                ### ℹ️ QR Code Format:
+                The QR code contains a compact signed payload:
+                ```
+                Q1:{EVENT_ID}:RegistrationNumber:Signature
+                ```
+                Scanners verify the signature locally and reject forged codes or badges from other events.
+                Registration numbers with lowercase letters or other characters outside `0-9 A-Z $%*+-./`
+                fall back to `RegistrationNumber_Name`.
+                """)
+            else:
+                st.markdown("""
+                ### ℹ️ QR Code Format:
+                The QR code contains:
+                ```
+                RegistrationNumber_Name
+                ```
+                **Example:** `REG123_JohnDoe`
+                
+                Set `QR_SECRET` to issue compact signed badges instead.
+                """)
+            
             st.markdown("""
-            ### ℹ️ QR Code Format:
-            The QR code contains:
-            ```
-            RegistrationNumber_Name
-            ```
-            **Example:** `REG123_JohnDoe`
             
             ### 📌 Notes:
             1. Registration numbers must be unique
@@ -145,47 +164,38 @@ def show():
                     st.error("CSV must contain 'Name' and 'Registration_Number' columns!")
                 else:
                     if st.button("Generate All QR Codes", key="bulk_generate", use_container_width=True):
-                        worksheet = get_google_sheet()
-                        success_count = 0
-                        duplicate_count = 0
-                        error_count = 0
+                        storage = get_storage()
                         
                         progress_bar = st.progress(0)
                         status_text = st.empty()
                         
-                        for idx, row in enumerate(df.iterrows()):
-                            _, data = row
-                            name = str(data['Name'])
-                            reg_num = str(data['Registration_Number'])
-                            
-                            status_text.text(f"Processing {idx+1}/{len(df)}: {name} ({reg_num})")
+                        def show_progress(done, total):
+                            status_text.text(f"Saving participants: batch {done}/{total}")
+                            progress_bar.progress(done / total)
+                        
+                        status_text.text(f"Checking {len(df)} rows against existing participants...")
+                        participants = df[['Name', 'Registration_Number']].fillna('').astype(str).values.tolist()
+                        result = storage.bulk_insert(participants, progress_callback=show_progress)
+                        
+                        success_count = len(result['added'])
+                        duplicate_count = result['duplicates']
+                        error_count = result['errors']
+                        
+                        added_time = pd.Timestamp.now().strftime("%H:%M:%S")
+                        for idx, (name, reg_num) in enumerate(result['added']):
+                            if idx % 100 == 0:
+                                status_text.text(f"Generating QR {idx+1}/{success_count}: {name} ({reg_num})")
                             
-                            try:
-                                # Check duplicate
-                                is_duplicate, _ = check_duplicate(worksheet, reg_num)
-                                
-                                if not is_duplicate:
-                                    # Add to sheet
-                                    worksheet.append_row([name, reg_num, "Absent"])
-                                    
-                                    # Generate QR
-                                    qr_data = f"{reg_num}_{name}"
-                                    generate_qr_code(qr_data, reg_num)
-                                    
-                                    # Add to recently added
-                                    st.session_state.recently_added.append({
-                                        'name': name,
-                                        'reg_num': reg_num,
-                                        'time': pd.Timestamp.now().strftime("%H:%M:%S")
-                                    })
-                                    
-                                    success_count += 1
-                                else:
-                                    duplicate_count += 1
-                            except:
-                                error_count += 1
+                            # Generate QR
+                            qr_data = make_payload(reg_num, name)
+                            generate_qr_code(qr_data, reg_num)
                             
-                            progress_bar.progress((idx + 1) / len(df))
+                            # Add to recently added
+                            st.session_state.recently_added.append({
+                                'name': name,
+                                'reg_num': reg_num,
+                                'time': added_time
+                            })
                         
                         status_text.empty()
                         
@@ -209,21 +219,20 @@ def show():
         st.markdown("### Existing Participants")
         
         try:
-            worksheet = get_google_sheet()
-            data = worksheet.get_all_records()
+            data = get_storage().list_participants()
             
             if data:
                 df = pd.DataFrame(data)
                 
                 # Show statistics
+                counts = get_stats()
                 col1, col2, col3 = st.columns(3)
                 with col1:
-                    st.metric("Total Participants", len(df))
+                    st.metric("Total Participants", counts['total'])
                 with col2:
-                    present = len(df[df['Status'] == 'Present'])
-                    st.metric("Present", present)
+                    st.metric("Present", counts['present'])
                 with col3:
-                    st.metric("Absent", len(df) - present)
+                    st.metric("Absent", counts['absent'])
                 
                 search_term = st.text_input("🔍 Search by name or registration number:")
                 if search_term:
@@ -256,7 +265,7 @@ def show():
                 
                 if selected_reg and st.button("🔁 Regenerate QR", use_container_width=True):
                     participant = df[df['Registration_Number'] == selected_reg].iloc[0]
-                    qr_data = f"{selected_reg}_{participant['Name']}"
+                    qr_data = make_payload(selected_reg, participant['Name'])
                     img_bytes = generate_qr_code(qr_data, selected_reg)
                     
                     # Display
@@ -1,10 +1,17 @@
 import streamlit as st
-import cv2
-import numpy as np
-from pyzbar.pyzbar import decode
+import pandas as pd
+import csv
+import io
 import time
 from datetime import datetime
-from utils import get_google_sheet, mark_attendance
+from storage import get_storage
+from stats import get_stats
+from journal import record_scan, record_scans
+from payload import read_payload, QR_REQUIRE_SIGNED
+from scanner import (open_camera, ScannerPipeline, RegionDecoder, format_stats,
+                     available_decoders, get_decoder, CALIBRATION_FRAMES, CodeCooldown, camera_registry,
+                     PreviewEncoder, AdaptivePreprocessor, parse_registration, expand_uploads,
+                     decode_images)
 import os
 import warnings
 
@@ -12,6 +19,24 @@ import warnings
 warnings.filterwarnings('ignore')
 os.environ['OPENCV_LOG_LEVEL'] = 'ERROR'
 
+# Scan results are handled at this rate regardless of capture and decode
+# speed; the camera preview has its own, lower cap (scanner.PREVIEW_FPS)
+DISPLAY_FPS = 15
+DISPLAY_INTERVAL = 1 / DISPLAY_FPS
+
+# Scan result messages expire on their own instead of pausing the scanner
+NOTIFICATION_TTL = 3
+MAX_NOTIFICATIONS = 3
+
+# Seconds between redraws of the per-file results while uploads decode
+UPLOAD_TABLE_INTERVAL = 0.5
+MARK_LABELS = {
+    "marked": "✅ Marked",
+    "already_present": "⚠️ Already present",
+    "queued": "🕒 Saved offline",
+    "not_found": "❌ Not registered"
+}
+
 def show():
     st.markdown('<h1 class="main-header">📷 Mark Attendance - QR Scanner</h1>', unsafe_allow_html=True)
     
@@ -20,52 +45,35 @@ def show():
         st.session_state.scanning = False
     if 'last_scanned' not in st.session_state:
         st.session_state.last_scanned = None
-    if 'scanned_codes' not in st.session_state:
-        st.session_state.scanned_codes = set()
     if 'camera_index' not in st.session_state:
         st.session_state.camera_index = 0
     if 'marked_records' not in st.session_state:
         st.session_state.marked_records = []
+    if 'notifications' not in st.session_state:
+        st.session_state.notifications = []
 
-    def get_available_cameras():
-        """Get list of available cameras without triggering errors"""
-        available_cameras = []
-        
-        # Try common camera indexes
-        for i in range(3):
-            try:
-                cap = cv2.VideoCapture(i, cv2.CAP_DSHOW)  
-                if cap.isOpened():
-                    ret, _ = cap.read()
-                    if ret:
-                        available_cameras.append(f"Camera {i}")
-                    cap.release()
-            except:
-                continue
-        
-        return available_cameras
+    def notify(html, ttl=NOTIFICATION_TTL):
+        """Queue a scan result message; it disappears on its own after ``ttl`` seconds"""
+        st.session_state.notifications.append({'html': html, 'expires_at': time.time() + ttl})
+        st.session_state.notifications_changed = True
+
+    def render_notifications(area):
+        """Show unexpired notifications in ``area``; cheap to call every frame"""
+        now = time.time()
+        active = [n for n in st.session_state.notifications if n['expires_at'] > now]
+        if len(active) == len(st.session_state.notifications) and not st.session_state.get('notifications_changed'):
+            return
+        st.session_state.notifications = active
+        st.session_state.notifications_changed = False
+        if active:
+            area.markdown("".join(n['html'] for n in active[-MAX_NOTIFICATIONS:]), unsafe_allow_html=True)
+        else:
+            area.empty()
 
     def scan_qr_code(camera_index=0):
         """Function to scan QR codes from webcam with error handling"""
         try:
-            backends = [
-                cv2.CAP_DSHOW,  
-                cv2.CAP_MSMF,   
-                cv2.CAP_ANY     
-            ]
-            
-            cap = None
-            for backend in backends:
-                try:
-                    cap = cv2.VideoCapture(camera_index, backend)
-                    if cap.isOpened():
-                        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-                        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-                        break
-                except:
-                    if cap:
-                        cap.release()
-                    continue
+            cap = open_camera(camera_index)
             
             if cap is None or not cap.isOpened():
                 st.error("❌ Could not access camera. Please check your camera connection.")
@@ -73,6 +81,7 @@ def show():
                 return
             
             stframe = st.empty()
+            stats_placeholder = st.empty()
             stop_placeholder = st.empty()
             
             if stop_placeholder.button("🛑 Stop Scanning", key="stop_scanner"):
@@ -81,157 +90,315 @@ def show():
             last_scan_time = time.time()
             scan_cooldown = 2  
             
-            while st.session_state.scanning:
-                ret, frame = cap.read()
-                if not ret:
-                    st.warning("Camera frame not available. Trying again...")
-                    time.sleep(0.5)
-                    continue
-                
-                frame = cv2.resize(frame, (640, 480))
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                
-                try:
-                    # Decode QR codes
-                    decoded_objects = decode(gray)
+            # Capture and decode run on their own threads; this loop only
+            # handles results and redraws the preview at a fixed rate
+            engine = st.session_state.get('decoder_engine', 'auto')
+            region_decoder = RegionDecoder() if st.session_state.roi_detection else None
+            pipeline = ScannerPipeline(
+                cap,
+                decoder=None if engine == 'auto' else get_decoder(engine),
+                region_decoder=region_decoder,
+                calibrate_frames=CALIBRATION_FRAMES if engine == 'auto' else 0,
+                preprocessor=AdaptivePreprocessor() if st.session_state.preprocessing else None
+            ).start()
+            gate_cooldown = CodeCooldown() if st.session_state.gate_mode else None
+            preview = PreviewEncoder()
+            try:
+                while st.session_state.scanning:
+                    tick = time.monotonic()
+                    results = pipeline.results()
                     
-                    for obj in decoded_objects:
-                        data = obj.data.decode('utf-8').strip()
+                    if gate_cooldown is not None:
+                        # Every distinct code goes through, each with its own cooldown
+                        codes = gate_cooldown.accept(results)
+                        if codes:
+                            process_qr_batch(codes, camera=camera_index)
+                        results = []
+                    
+                    for result in results:
+                        data = result['data']
                         
                         current_time = time.time()
                         if current_time - last_scan_time < scan_cooldown:
                             continue
                         
-                        points = obj.polygon
-                        if len(points) == 4:
-                            pts = np.array(points, dtype=np.int32)
-                            pts = pts.reshape((-1, 1, 2))
-                            cv2.polylines(frame, [pts], True, (0, 255, 0), 2)
-                        
-                        cv2.putText(frame, f"QR: {data[:20]}...", 
-                                   (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 
-                                   0.7, (0, 0, 255), 2)
-                        
                         if data and data != st.session_state.last_scanned:
-                            process_qr_data(data)
+                            process_qr_data(data, camera=camera_index)
                             st.session_state.last_scanned = data
                             last_scan_time = current_time
                     
-                except Exception as e:
-                    pass
-
-                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                stframe.image(rgb_frame, channels="RGB", use_column_width=True)
-                
-                if not st.session_state.scanning:
-                    break
-                
-                time.sleep(0.05)
-            
-            # Release camera
-            cap.release()
-            cv2.destroyAllWindows()
+                    # The preview copies the pooled frame before capture can reuse it
+                    with pipeline.borrow_frame() as (frame, seq):
+                        jpeg = preview.encode(frame, seq, pipeline.detections())
+                    if jpeg is not None:
+                        stframe.image(jpeg, use_column_width=True)
+                    
+                    render_notifications(notification_area)
+                    pipeline.record_display(time.monotonic() - tick)
+                    if frame is None and pipeline.read_failures:
+                        stats_placeholder.warning("Camera frame not available. Trying again...")
+                    else:
+                        stats_placeholder.caption(format_stats(pipeline.stats(), preview.stats()))
+                    
+                    if not st.session_state.scanning:
+                        break
+                    
+                    time.sleep(max(0, DISPLAY_INTERVAL - (time.monotonic() - tick)))
+            finally:
+                # Also runs when Streamlit interrupts the loop on a rerun
+                pipeline.stop()
             
         except Exception as e:
             st.error(f"Camera error: {str(e)}")
             st.session_state.scanning = False
 
-    def process_qr_data(qr_data):
+    def parse_qr_data(qr_data, require_signed=QR_REQUIRE_SIGNED):
+        """Verify and split QR data into (reg_num, name); None if the code is rejected"""
+        reg_num, name, error = read_payload(qr_data, require_signed)
+        if error:
+            notify(f'<div class="warning-message"><p>⚠️ Invalid QR code: {error}</p></div>')
+            return None
+        
+        return reg_num, name or "Unknown"
+
+    def process_qr_data(qr_data, camera=None, require_signed=QR_REQUIRE_SIGNED):
         """Process scanned QR data"""
         try:
-            if '_' in qr_data:
-                parts = qr_data.split('_')
-                reg_num = parts[0]
-                name = '_'.join(parts[1:]) if len(parts) > 1 else "Unknown"
-            else:
-                reg_num = qr_data.strip()
-                name = "Unknown"
-            
-            if not reg_num:
-                st.warning("⚠️ Invalid QR code: No registration number found")
+            parsed = parse_qr_data(qr_data, require_signed)
+            if parsed is None:
                 return
+            reg_num, name = parsed
             
-            if reg_num in st.session_state.scanned_codes:
-                st.warning(f"⚠️ {name} ({reg_num}) already marked in this session!")
+            # Journal the scan first so it survives a Sheets outage, then mark it
+            result, participant_name = record_scan(reg_num, camera=camera)
+            show_result(reg_num, name, result, participant_name)
+        
+        except Exception as e:
+            show_error(e)
+
+    def process_qr_batch(codes, camera=None):
+        """Mark every code seen in one pass of the gate loop with a single journal write"""
+        try:
+            parsed = [p for p in (parse_qr_data(code) for code in codes) if p is not None]
+            if not parsed:
                 return
+            results = record_scans([reg_num for reg_num, _ in parsed], camera=camera)
+            for (reg_num, name), (result, participant_name) in zip(parsed, results):
+                show_result(reg_num, name, result, participant_name, celebrate=False)
+        
+        except Exception as e:
+            show_error(e)
+
+    def show_result(reg_num, name, result, participant_name, celebrate=True):
+        """Notify and record the outcome of marking one registration number"""
+        if result == "marked":
+            display_name = participant_name if participant_name else name
+            
+            # Add to marked records
+            st.session_state.marked_records.append({
+                'name': display_name,
+                'reg_num': reg_num,
+                'time': datetime.now().strftime("%H:%M:%S"),
+                'status': 'Newly Marked'
+            })
             
-            worksheet = get_google_sheet()
+            # Success message
+            notify(f"""
+            <div class="success-message">
+            <h3>🎉 Attendance Marked Successfully!</h3>
+            <p><strong>Name:</strong> {display_name}</p>
+            <p><strong>Registration:</strong> {reg_num}</p>
+            <p><strong>Status:</strong> ✅ PRESENT</p>
+            <p><strong>Time:</strong> {datetime.now().strftime("%H:%M:%S")}</p>
+            </div>
+            """)
+            
+            if celebrate:
+                st.balloons()
+            
+        elif result == "already_present":
+            display_name = participant_name if participant_name else name
+            
+            # Warning message for already marked
+            notify(f"""
+            <div class="warning-message">
+            <h3>⚠️ Already Marked Present!</h3>
+            <p><strong>Name:</strong> {display_name}</p>
+            <p><strong>Registration:</strong> {reg_num}</p>
+            <p><strong>Status:</strong> ✅ ALREADY PRESENT</p>
+            <p><strong>Time:</strong> {datetime.now().strftime("%H:%M:%S")}</p>
+            <p><em>This participant was already marked as present earlier.</em></p>
+            </div>
+            """)
+            
+            # Add to marked records as already present
+            st.session_state.marked_records.append({
+                'name': display_name,
+                'reg_num': reg_num,
+                'time': datetime.now().strftime("%H:%M:%S"),
+                'status': 'Already Present'
+            })
             
-            # Mark attendance
-            result, participant_name = mark_attendance(worksheet, reg_num)
+        elif result == "queued":
+            notify(f"""
+            <div class="info-message">
+            <h3>🕒 Scan Saved Offline</h3>
+            <p><strong>Registration:</strong> {reg_num}</p>
+            <p>Google Sheets is not reachable right now. The scan is saved locally and will be synced automatically.</p>
+            </div>
+            """)
             
-            if result == "marked":
-                st.session_state.scanned_codes.add(reg_num)
-                display_name = participant_name if participant_name else name
-                
-                # Add to marked records
+            st.session_state.marked_records.append({
+                'name': name,
+                'reg_num': reg_num,
+                'time': datetime.now().strftime("%H:%M:%S"),
+                'status': 'Saved Offline'
+            })
+            
+        else:
+            notify(f"""
+            <div class="error-message">
+            <h3>❌ Registration Not Found</h3>
+            <p>Registration number <strong>{reg_num}</strong> not found in database.</p>
+            <p>Please generate QR code first or check the registration number.</p>
+            </div>
+            """)
+
+    def process_uploads(uploads):
+        """Decode uploaded photos across CPU cores, then mark every code found in one batch"""
+        images = list(expand_uploads((upload.name, upload.getvalue()) for upload in uploads))
+        if not images:
+            st.warning("⚠️ No images found in the upload.")
+            return
+        
+        progress = st.progress(0.0)
+        status = st.empty()
+        table = st.empty()
+        rows = []
+        last_drawn = 0.0
+        for done, result in enumerate(decode_images(images), start=1):
+            rows.append({
+                'File': result['file'],
+                'Codes': result['codes'],
+                'Result': result['error'] or ("Decoded" if result['codes'] else "No QR code found")
+            })
+            progress.progress(done / len(images))
+            status.caption(f"Decoded {done} of {len(images)} images")
+            if time.monotonic() - last_drawn >= UPLOAD_TABLE_INTERVAL or done == len(images):
+                table.dataframe(pd.DataFrame(rows).assign(Codes=lambda df: df['Codes'].str.join(', ')),
+                                use_container_width=True, hide_index=True)
+                last_drawn = time.monotonic()
+        
+        registrations = list(dict.fromkeys(
+            parse_registration(code) for row in rows for code in row['Codes'] if parse_registration(code)
+        ))
+        if not registrations:
+            status.warning("⚠️ No QR codes found in the uploaded images.")
+            return
+        
+        status.caption(f"Marking {len(registrations)} registration numbers...")
+        outcomes = dict(zip(registrations, record_scans(registrations, camera="upload")))
+        try:
+            # Push the whole batch to storage now rather than on the next flush tick
+            get_storage().flush()
+        except Exception:
+            pass
+        
+        now = datetime.now().strftime("%H:%M:%S")
+        for reg_num, (result, participant_name) in outcomes.items():
+            status_label = {"marked": "Newly Marked", "already_present": "Already Present",
+                            "queued": "Saved Offline"}.get(result)
+            if status_label:
                 st.session_state.marked_records.append({
-                    'name': display_name,
+                    'name': participant_name or "Unknown",
                     'reg_num': reg_num,
-                    'time': datetime.now().strftime("%H:%M:%S"),
-                    'status': 'Newly Marked'
+                    'time': now,
+                    'status': status_label
                 })
-                
-                # Success message
-                success_placeholder = st.empty()
-                success_placeholder.markdown(f"""
-                <div class="success-message">
-                <h3>🎉 Attendance Marked Successfully!</h3>
-                <p><strong>Name:</strong> {display_name}</p>
-                <p><strong>Registration:</strong> {reg_num}</p>
-                <p><strong>Status:</strong> ✅ PRESENT</p>
-                <p><strong>Time:</strong> {datetime.now().strftime("%H:%M:%S")}</p>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                st.balloons()
-                
-                time.sleep(3)
-                success_placeholder.empty()
-                
-            elif result == "already_present":
-                display_name = participant_name if participant_name else name
-                
-                # Warning message for already marked
-                warning_placeholder = st.empty()
-                warning_placeholder.markdown(f"""
-                <div class="warning-message">
-                <h3>⚠️ Already Marked Present!</h3>
-                <p><strong>Name:</strong> {display_name}</p>
-                <p><strong>Registration:</strong> {reg_num}</p>
-                <p><strong>Status:</strong> ✅ ALREADY PRESENT</p>
-                <p><strong>Time:</strong> {datetime.now().strftime("%H:%M:%S")}</p>
-                <p><em>This participant was already marked as present earlier.</em></p>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                # Add to marked records as already present
+        for row in rows:
+            if row['Codes']:
+                row['Result'] = ", ".join(
+                    f"{reg_num}: {MARK_LABELS.get(outcomes[reg_num][0], '-')}" if reg_num else "🚫 Rejected"
+                    for reg_num in map(parse_registration, row['Codes'])
+                )
+        table.dataframe(pd.DataFrame(rows).assign(Codes=lambda df: df['Codes'].str.join(', ')),
+                        use_container_width=True, hide_index=True)
+        
+        counts = {}
+        for result, _ in outcomes.values():
+            counts[result] = counts.get(result, 0) + 1
+        status.success(f"✅ {len(images)} images, {len(registrations)} codes: " + ", ".join(
+            f"{MARK_LABELS.get(result, result)} {count}" for result, count in counts.items()
+        ))
+
+    def parse_registration_list(text):
+        """Registration numbers from pasted lines or CSV text, in order
+
+        A header row naming a Registration_Number column selects that
+        column; otherwise the first column is used.
+        """
+        rows = [row for row in csv.reader(io.StringIO(text)) if row and any(cell.strip() for cell in row)]
+        if not rows:
+            return []
+        column = 0
+        header = [cell.strip().lower() for cell in rows[0]]
+        if 'registration_number' in header:
+            column = header.index('registration_number')
+            rows = rows[1:]
+        registrations = (read_payload(row[column], require_signed=False)[0] for row in rows if len(row) > column)
+        return [reg_num for reg_num in registrations if reg_num]
+
+    def process_bulk_entry(registrations):
+        """Mark a pasted or uploaded list in one batch and show a results table"""
+        if not registrations:
+            st.warning("⚠️ No registration numbers found.")
+            return
+        
+        with st.spinner(f"Marking {len(registrations)} registration numbers..."):
+            try:
+                # A sign-in list can name people added to the sheet moments
+                # ago, so check it against a fresh copy
+                get_storage().refresh()
+            except Exception:
+                pass
+            results = record_scans(registrations, camera="manual")
+            try:
+                # Send the whole list to storage as one batch update now
+                get_storage().flush()
+            except Exception:
+                pass
+        
+        now = datetime.now().strftime("%H:%M:%S")
+        rows = []
+        for reg_num, (result, participant_name) in zip(registrations, results):
+            rows.append({
+                'Registration': reg_num,
+                'Name': participant_name or "-",
+                'Result': MARK_LABELS.get(result, result)
+            })
+            status_label = {"marked": "Newly Marked", "already_present": "Already Present",
+                            "queued": "Saved Offline"}.get(result)
+            if status_label:
                 st.session_state.marked_records.append({
-                    'name': display_name,
+                    'name': participant_name or "Unknown",
                     'reg_num': reg_num,
-                    'time': datetime.now().strftime("%H:%M:%S"),
-                    'status': 'Already Present'
+                    'time': now,
+                    'status': status_label
                 })
-                
-                time.sleep(3)
-                warning_placeholder.empty()
-                
-            else:
-                st.markdown(f"""
-                <div class="error-message">
-                <h3>❌ Registration Not Found</h3>
-                <p>Registration number <strong>{reg_num}</strong> not found in database.</p>
-                <p>Please generate QR code first or check the registration number.</p>
-                </div>
-                """, unsafe_allow_html=True)
         
-        except Exception as e:
-            st.markdown(f"""
-            <div class="error-message">
-            <h3>❌ Error Processing QR Code</h3>
-            <p>Error: {str(e)}</p>
-            </div>
-            """, unsafe_allow_html=True)
+        counts = {label: sum(1 for row in rows if row['Result'] == label) for label in MARK_LABELS.values()}
+        metric_cols = st.columns(len(counts))
+        for col, (label, count) in zip(metric_cols, counts.items()):
+            col.metric(label, count)
+        st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+
+    def show_error(e):
+        notify(f"""
+        <div class="error-message">
+        <h3>❌ Error Processing QR Code</h3>
+        <p>Error: {str(e)}</p>
+        </div>
+        """)
 
     # Main interface
     col1, col2 = st.columns([2, 1])
@@ -257,20 +424,57 @@ def show():
 
         st.markdown("### 🔍 Camera Selection")
         
-        available_cameras = get_available_cameras()
+        # Discovered once in the background and cached across reruns
+        available_cameras = camera_registry.cameras()
         
-        if available_cameras:
+        if available_cameras is None:
+            st.info("🔎 Looking for cameras... Using default camera for now.")
+            st.session_state.camera_index = 0
+        elif available_cameras:
             selected_camera = st.selectbox(
                 "Choose camera:",
                 available_cameras,
                 index=0,
+                format_func=lambda camera: f"Camera {camera['index']} ({camera['name']})"
+                if camera['name'] != f"Camera {camera['index']}" else camera['name'],
                 help="Select the camera you want to use for scanning"
             )
-            st.session_state.camera_index = int(selected_camera.split()[-1])
+            st.session_state.camera_index = selected_camera['index']
             st.success(f"✅ Camera {st.session_state.camera_index} selected and ready!")
         else:
             st.warning("⚠️ No cameras detected! Using default camera.")
             st.session_state.camera_index = 0
+        
+        if st.button("🔄 Rescan Cameras", key="rescan_cameras",
+                     help="Look for cameras again, e.g. after plugging one in"):
+            camera_registry.refresh()
+            st.rerun()
+        
+        st.session_state.roi_detection = st.checkbox(
+            "🎯 Region-of-interest detection",
+            value=st.session_state.get('roi_detection', True),
+            help="Decode only where a QR code is likely to be. Uses less CPU and reads smaller, more distant codes."
+        )
+
+        st.session_state.preprocessing = st.checkbox(
+            "🌗 Poor-lighting recovery",
+            value=st.session_state.get('preprocessing', True),
+            help="When a code is visible but unreadable, retry it with contrast, threshold, sharpen and invert fixes"
+        )
+
+        st.session_state.gate_mode = st.checkbox(
+            "🚪 Gate mode",
+            value=st.session_state.get('gate_mode', False),
+            help="For a queue walking past the camera: mark every code in view at once, with a separate cooldown per code"
+        )
+
+        engines = ['auto'] + available_decoders()
+        st.session_state.decoder_engine = st.selectbox(
+            "🧩 Decoder engine",
+            engines,
+            index=engines.index(st.session_state.get('decoder_engine', 'auto')),
+            help="'auto' benchmarks every engine on the first frames from this camera and keeps the best one"
+        )
 
     with col2:
         st.markdown("### ⚡ Quick Actions")
@@ -298,12 +502,15 @@ def show():
                     use_container_width=True,
                     help="Clear current scanning session"):
             st.session_state.scanning = False
-            st.session_state.scanned_codes.clear()
             st.session_state.last_scanned = None
             st.session_state.marked_records = []
             st.success("Session cleared! Ready for new scanning.")
             st.rerun()
 
+    notification_area = st.empty()
+    st.session_state.notifications_changed = True
+    render_notifications(notification_area)
+
     # Scanner section
     if st.session_state.scanning:
         st.markdown("---")
@@ -347,7 +554,43 @@ def show():
             else:
                 qr_data = manual_reg
             
-            process_qr_data(qr_data)
+            # Typed entries are checked against storage, not a badge signature
+            process_qr_data(qr_data, camera="manual", require_signed=False)
+            render_notifications(notification_area)
+        
+        st.markdown("---")
+        st.markdown("**📋 Bulk entry** - paste a sign-in list or upload a CSV")
+        
+        bulk_text = st.text_area(
+            "Registration numbers:",
+            placeholder="One per line, or CSV with a Registration_Number column",
+            height=150,
+            key="bulk_regs"
+        )
+        bulk_file = st.file_uploader(
+            "Or upload a CSV:",
+            type=['csv', 'txt'],
+            key="bulk_file"
+        )
+        
+        if st.button("✅ Mark All", use_container_width=True, key="bulk_button",
+                     disabled=not (bulk_text.strip() or bulk_file)):
+            text = bulk_file.getvalue().decode('utf-8-sig') if bulk_file else bulk_text
+            process_bulk_entry(parse_registration_list(text))
+
+    st.markdown("### 📁 Upload Badge Photos")
+
+    with st.expander("Decode many photos or a ZIP of door-camera snapshots at once", expanded=False):
+        uploads = st.file_uploader(
+            "Photos or ZIP archives:",
+            type=['png', 'jpg', 'jpeg', 'bmp', 'webp', 'zip'],
+            accept_multiple_files=True,
+            help="Every QR code found is marked present in one batch",
+            key="badge_uploads"
+        )
+        
+        if st.button("🔍 Decode & Mark", use_container_width=True, key="upload_button", disabled=not uploads):
+            process_uploads(uploads)
 
 
     st.markdown("---")
@@ -367,6 +610,8 @@ def show():
         for record in reversed(st.session_state.marked_records[-10:]):  # Show last 10
             if record['status'] == 'Newly Marked':
                 st.markdown(f"✅ **{record['name']}** ({record['reg_num']}) - {record['time']}")
+            elif record['status'] == 'Saved Offline':
+                st.markdown(f"🕒 **{record['name']}** ({record['reg_num']}) - Saved Offline - {record['time']}")
             else:
                 st.markdown(f"⚠️ **{record['name']}** ({record['reg_num']}) - Already Present - {record['time']}")
     else:
@@ -374,11 +619,11 @@ def show():
 
     # Show overall statistics
     try:
-        worksheet = get_google_sheet()
-        data = worksheet.get_all_records()
+        storage = get_storage()
+        counts = get_stats()
         
-        present_count = len([row for row in data if row.get('Status', '').lower() == 'present'])
-        total_count = len(data)
+        present_count = counts['present']
+        total_count = counts['total']
         
         st.markdown("---")
         
@@ -396,6 +641,16 @@ def show():
             st.progress(attendance_rate / 100)
             st.caption(f"Overall Attendance Rate: {attendance_rate:.1f}%")
         
+        writer_stats = storage.write_stats()
+        if writer_stats is not None:
+            latency = writer_stats['last_flush_latency']
+            st.caption(
+                f"Pending sheet writes: {writer_stats['queue_depth']} | "
+                f"Last flush: {f'{latency * 1000:.0f} ms' if latency is not None else 'n/a'}"
+            )
+            if writer_stats['last_error']:
+                st.warning(f"⚠️ Sheet sync is retrying: {writer_stats['last_error']}")
+        
     except Exception as e:
         st.error(f"Could not load attendance data: {str(e)}")
 
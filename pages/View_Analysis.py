@@ -3,16 +3,17 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
-from utils import get_google_sheet
+from storage import get_storage
+from stats import get_stats
 import io
 
 def show():
     st.markdown('<h1 class="main-header">📊 Attendance Analysis</h1>', unsafe_allow_html=True)
 
     try:
-        # Get data from Google Sheets
-        worksheet = get_google_sheet()
-        data = worksheet.get_all_records()
+        # Get data from the configured storage backend
+        storage = get_storage()
+        data = storage.list_participants()
         
         if not data:
             st.info("No attendance data available yet.")
@@ -20,9 +21,10 @@ def show():
         
         df = pd.DataFrame(data)
         
-        total = len(df)
-        present = len(df[df['Status'].str.lower() == 'present'])
-        absent = total - present
+        counts = get_stats()
+        total = counts['total']
+        present = counts['present']
+        absent = counts['absent']
         attendance_rate = (present / total * 100) if total > 0 else 0
         
         st.markdown("### 📈 Overall Statistics")
@@ -205,6 +207,15 @@ def show():
                         use_container_width=True
                     )
             
+            if storage.name == "sqlite":
+                st.markdown("**☁️ Google Sheets Mirror:**")
+                if st.button("Export to Google Sheets", key="sheet_export", use_container_width=True):
+                    try:
+                        exported = storage.export_to_sheet()
+                        st.success(f"✅ Exported {exported} participants to Google Sheets")
+                    except Exception as e:
+                        st.error(f"❌ Export to Google Sheets failed: {str(e)}")
+            
             st.markdown("---")
             st.markdown("### 📋 Report Summary")
             
@@ -0,0 +1,182 @@
+"""Headless scanner benchmark: replay a video file or a directory of frames
+
+Runs the same capture -> decode -> mark path as the Mark Attendance page,
+against the in-memory storage backend, and reports throughput, decode rate
+and scan-to-mark latency.
+
+    python replay.py recording.mp4
+    python replay.py frames/ --fps 15 --gate --engine opencv --json
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+
+# The replay must never touch the real sheet or the kiosk's scan journal
+os.environ['ATTENDANCE_BACKEND'] = 'memory'
+os.environ.setdefault('SCAN_JOURNAL', os.path.join(tempfile.mkdtemp(prefix='replay-'), 'scan_journal.jsonl'))
+
+from journal import record_scans
+from scanner import (ScannerPipeline, RegionDecoder, CodeCooldown, AdaptivePreprocessor, get_decoder,
+                     available_decoders, parse_registration, FrameSource, CALIBRATION_FRAMES)
+from storage import get_storage
+
+# Matches the page: results are handled once per redraw, and outside gate
+# mode one code is accepted at most every SCAN_COOLDOWN seconds
+POLL_INTERVAL = 1 / 15
+SCAN_COOLDOWN = 2
+# How long to keep draining after the last frame, for decodes still in flight
+DRAIN_TIMEOUT = 1.0
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def load_participants(path):
+    """Read (name, registration_number) pairs from a CSV with a header row"""
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = list(csv.reader(f))
+    return [(row[0], row[1]) for row in rows[1:] if len(row) >= 2]
+
+
+def run(source, engine='auto', roi=True, gate=False, preprocess=True, participants=None):
+    """Replay ``source`` through the scanner and marking path; returns a report dict"""
+    storage = get_storage()
+    if participants:
+        storage.bulk_insert(participants)
+    else:
+        storage.accept_unknown = True
+
+    pipeline = ScannerPipeline(
+        source,
+        decoder=None if engine == 'auto' else get_decoder(engine),
+        region_decoder=RegionDecoder() if roi else None,
+        calibrate_frames=CALIBRATION_FRAMES if engine == 'auto' else 0,
+        preprocessor=AdaptivePreprocessor() if preprocess else None
+    )
+    cooldown = CodeCooldown() if gate else None
+    last_scanned = None
+    last_scan_time = float('-inf')
+    latencies = []
+    outcomes = {}
+
+    def mark(codes, captured_at):
+        rejected = [code for code in codes if parse_registration(code) is None]
+        if rejected:
+            outcomes['rejected'] = outcomes.get('rejected', 0) + len(rejected)
+        codes = [code for code in codes if code not in rejected]
+        results = record_scans([parse_registration(code) for code in codes], camera="replay")
+        marked_at = time.monotonic()
+        for code, (result, _) in zip(codes, results):
+            outcomes[result] = outcomes.get(result, 0) + 1
+            latencies.append(marked_at - captured_at[code])
+
+    started = time.monotonic()
+    pipeline.start()
+    drained_at = None
+    try:
+        while True:
+            results = pipeline.results()
+            captured_at = {}
+            for result in results:
+                captured_at.setdefault(result['data'], result['captured_at'])
+
+            if cooldown is not None:
+                codes = cooldown.accept(results)
+                if codes:
+                    mark(codes, captured_at)
+            else:
+                for result in results:
+                    now = time.monotonic()
+                    if now - last_scan_time < SCAN_COOLDOWN:
+                        continue
+                    if result['data'] and result['data'] != last_scanned:
+                        mark([result['data']], captured_at)
+                        last_scanned = result['data']
+                        last_scan_time = now
+
+            if source.exhausted:
+                drained_at = drained_at or time.monotonic()
+                if time.monotonic() - drained_at > DRAIN_TIMEOUT:
+                    break
+            time.sleep(POLL_INTERVAL)
+    finally:
+        pipeline.stop()
+    elapsed = (drained_at or time.monotonic()) - started
+
+    stats = pipeline.stats()
+    return {
+        'source': source.path,
+        'engine': stats['engine'],
+        'roi': roi,
+        'gate': gate,
+        'frames': source.frames_read,
+        'decoded_frames': stats['decoded_frames'],
+        'dropped_frames': stats['dropped_frames'],
+        'fps': source.frames_read / elapsed if elapsed else 0.0,
+        'decode_fps': stats['decoded_frames'] / elapsed if elapsed else 0.0,
+        'decode_rate': stats['frames_with_codes'] / stats['decoded_frames'] if stats['decoded_frames'] else 0.0,
+        'scans': len(latencies),
+        'outcomes': outcomes,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'engine_report': pipeline.engine_report,
+        'preprocess': stats['preprocess']
+    }
+
+
+def format_report(report):
+    lines = [
+        f"Source:         {report['source']}",
+        f"Engine:         {report['engine']} (ROI {'on' if report['roi'] else 'off'}, "
+        f"gate mode {'on' if report['gate'] else 'off'}, "
+        f"preprocessing {'on' if report['preprocess'] is not None else 'off'})",
+        f"Frames:         {report['frames']} read, {report['decoded_frames']} decoded, "
+        f"{report['dropped_frames']} skipped",
+        f"Throughput:     {report['fps']:.1f} fps captured, {report['decode_fps']:.1f} fps decoded",
+        f"Decode rate:    {report['decode_rate']:.1%} of decoded frames had a code",
+        f"Scans marked:   {report['scans']} {report['outcomes']}",
+        f"Scan to mark:   p50 {report['p50_ms']:.1f} ms | p95 {report['p95_ms']:.1f} ms | "
+        f"p99 {report['p99_ms']:.1f} ms"
+    ]
+    if report['preprocess'] is not None:
+        lines.append(f"Recovered:      {report['preprocess']['recovered']} of {report['preprocess']['frames']} "
+                     f"undecodable frames {report['preprocess']['transforms']}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recording through the QR scanner pipeline")
+    parser.add_argument('source', help="video file or directory of frame images")
+    parser.add_argument('--fps', type=float, default=None,
+                        help="playback rate (default: the video's own rate, or 30 for frame directories)")
+    parser.add_argument('--engine', choices=['auto'] + available_decoders(), default='auto')
+    parser.add_argument('--no-roi', action='store_true', help="decode full frames only")
+    parser.add_argument('--no-preprocess', action='store_true', help="disable poor-lighting recovery")
+    parser.add_argument('--gate', action='store_true', help="use gate mode (every code, per-code cooldown)")
+    parser.add_argument('--participants', help="CSV of Name,Registration_Number to seed the stub store")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = run(
+        FrameSource(args.source, fps=args.fps),
+        engine=args.engine,
+        roi=not args.no_roi,
+        gate=args.gate,
+        preprocess=not args.no_preprocess,
+        participants=load_participants(args.participants) if args.participants else None
+    )
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,1075 @@
+import glob
+import io
+import multiprocessing
+import os
+import re
+import sys
+import threading
+import time
+import queue
+import zipfile
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+
+from payload import read_payload
+
+try:
+    from pyzbar.pyzbar import decode, ZBarSymbol
+except ImportError:
+    # zbar's shared library is missing; the OpenCV engine still works
+    decode = None
+
+FRAME_WIDTH = 640
+FRAME_HEIGHT = 480
+
+# Preallocated frame buffers the capture thread cycles through. A buffer is
+# overwritten this many frames after it was filled, unless a consumer (gray
+# conversion, preview) has reserved it and not yet released it.
+FRAME_POOL_SIZE = 4
+# Decoded codes waiting for the UI; when the UI falls behind, the oldest
+# results are dropped rather than blocking the decoder.
+RESULT_QUEUE_SIZE = 32
+# How long a detected polygon stays drawn on the preview
+DETECTION_OVERLAY_TTL = 0.5
+# Browser preview, independent of the decode rate: frames per second sent,
+# JPEG quality and width. Raw 640x480 RGB is ~900 KB a frame; a JPEG at
+# these settings is a few tens of KB.
+PREVIEW_FPS = float(os.environ.get('PREVIEW_FPS', 10))
+PREVIEW_QUALITY = int(os.environ.get('PREVIEW_QUALITY', 70))
+PREVIEW_WIDTH = int(os.environ.get('PREVIEW_WIDTH', 480))
+# Recorded sources (video files, frame directories): image types read, and
+# the playback rate when the source does not say
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.webp')
+DEFAULT_SOURCE_FPS = 30
+# Uploaded photos: phone pictures are decoded at this size first and only
+# retried at full resolution if that fails.
+UPLOAD_DECODE_SIZE = 1600
+# Camera discovery: indexes probed where device enumeration is unavailable,
+# and how long a page waits for a background scan before moving on.
+CAMERA_PROBE_COUNT = 3
+CAMERA_SCAN_WAIT = 2.0
+# Gate mode: seconds before the same code is accepted again. Other codes
+# are never held back by it.
+GATE_CODE_COOLDOWN = 5
+
+# Decoder calibration: frames collected at startup to benchmark each engine,
+# and how many rounds to wait for a frame with a code in it before falling
+# back to picking the fastest engine.
+CALIBRATION_FRAMES = 30
+CALIBRATION_ATTEMPTS = 3
+
+# Region-of-interest detection: candidate regions are found on a frame
+# downscaled by ROI_DETECT_SCALE, tracked codes are searched for again for
+# ROI_TRACK_FRAMES frames, and the whole frame is still decoded every
+# ROI_FULL_FRAME_INTERVAL frames in case both missed something.
+ROI_DETECT_SCALE = 0.5
+ROI_TRACK_FRAMES = 15
+ROI_FULL_FRAME_INTERVAL = 10
+ROI_MARGIN = 0.5
+ROI_GRADIENT_THRESHOLD = 60
+# A decodable QR code needs at least ~1.5 px per module, so anything
+# smaller than ROI_MIN_SIZE px across is not worth a decode attempt
+ROI_MIN_SIZE = 32
+ROI_MAX_CANDIDATES = 3
+# Crops smaller than this are upscaled before decoding so distant codes
+# still get a few pixels per module
+ROI_MIN_DECODE_SIZE = 200
+
+# Adaptive preprocessing: only frames where a code was detected but not
+# decoded go through these transforms, and at most this many regions each.
+PREPROCESS_MAX_REGIONS = 2
+# Without ROI detection, frames that did not decode get the cheap candidate
+# search every time, but the full-frame finder-pattern search only this often
+PREPROCESS_INTERVAL = 10
+SHARPEN_KERNEL = np.array([[0, -1, 0], [-1, 5, -1], [0, -1, 0]], dtype=np.float32)
+
+
+class StageStats:
+    """Rolling frames-per-second and latency for one pipeline stage"""
+
+    def __init__(self, window=60):
+        self._lock = threading.Lock()
+        self._times = deque(maxlen=window)
+        self._latencies = deque(maxlen=window)
+
+    def record(self, latency):
+        with self._lock:
+            self._times.append(time.monotonic())
+            self._latencies.append(latency)
+
+    def snapshot(self):
+        with self._lock:
+            times = list(self._times)
+            latencies = sorted(self._latencies)
+        fps = (len(times) - 1) / (times[-1] - times[0]) if len(times) > 1 and times[-1] > times[0] else 0.0
+        if not latencies:
+            return {'fps': fps, 'latency_ms': 0.0, 'p95_ms': 0.0}
+        return {
+            'fps': fps,
+            'latency_ms': sum(latencies) / len(latencies) * 1000,
+            'p95_ms': latencies[int(0.95 * (len(latencies) - 1))] * 1000
+        }
+
+
+class FramePool:
+    """Fixed ring of reusable frame buffers, so capture allocates nothing per frame
+
+    Buffers reserved by a reader are skipped until released, so a frame is
+    never overwritten while it is being read.
+    """
+
+    def __init__(self, shape=(FRAME_HEIGHT, FRAME_WIDTH, 3), size=FRAME_POOL_SIZE):
+        self.shape = shape
+        self.buffers = [np.empty(shape, dtype=np.uint8) for _ in range(size)]
+        self._next = 0
+        self._lock = threading.Lock()
+        self._reserved = {}
+
+    def next(self):
+        with self._lock:
+            for _ in range(len(self.buffers)):
+                buffer = self.buffers[self._next]
+                self._next = (self._next + 1) % len(self.buffers)
+                if id(buffer) not in self._reserved:
+                    return buffer
+        # Every buffer is being read; fall back to a fresh one
+        return np.empty(self.shape, dtype=np.uint8)
+
+    def reserve(self, buffer):
+        with self._lock:
+            self._reserved[id(buffer)] = self._reserved.get(id(buffer), 0) + 1
+
+    def release(self, buffer):
+        with self._lock:
+            count = self._reserved.pop(id(buffer), 1) - 1
+            if count:
+                self._reserved[id(buffer)] = count
+
+
+class LatestFrame:
+    """Single-slot buffer that only ever holds the newest frame"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._frame = None
+        self._captured_at = 0.0
+        self.seq = 0
+
+    def put(self, frame, captured_at):
+        with self._cond:
+            self._frame = frame
+            self._captured_at = captured_at
+            self.seq += 1
+            self._cond.notify_all()
+
+    def peek(self, reserve=None):
+        """Return (frame, captured_at, seq), passing the frame to ``reserve`` first"""
+        with self._cond:
+            if reserve is not None and self._frame is not None:
+                reserve(self._frame)
+            return self._frame, self._captured_at, self.seq
+
+    def wait_newer(self, seq, timeout=0.5, reserve=None):
+        """Return (seq, frame, captured_at) newer than ``seq``, or None on timeout"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.seq > seq, timeout=timeout):
+                return None
+            if reserve is not None:
+                reserve(self._frame)
+            return self.seq, self._frame, self._captured_at
+
+
+class PyzbarDecoder:
+    """ZBar engine via pyzbar, restricted to QR codes"""
+
+    name = "pyzbar"
+
+    def decode(self, gray):
+        return [
+            {
+                'data': obj.data.decode('utf-8', errors='replace').strip(),
+                'polygon': [(point.x, point.y) for point in obj.polygon]
+            }
+            for obj in decode(gray, symbols=[ZBarSymbol.QRCODE])
+        ]
+
+
+class OpenCVDecoder:
+    """OpenCV's built-in QR detector, which handles several codes per frame"""
+
+    name = "opencv"
+
+    def __init__(self):
+        self._detector = cv2.QRCodeDetector()
+
+    def decode(self, gray):
+        try:
+            ok, texts, points, _ = self._detector.detectAndDecodeMulti(gray)
+        except cv2.error:
+            # Raised on some degenerate images, e.g. nearly flat ones
+            return []
+        if not ok or points is None:
+            return []
+        return [
+            {
+                'data': text.strip(),
+                'polygon': [(int(x), int(y)) for x, y in corners]
+            }
+            for text, corners in zip(texts, points)
+            if text
+        ]
+
+
+DECODERS = {
+    'pyzbar': PyzbarDecoder,
+    'opencv': OpenCVDecoder
+}
+
+
+def available_decoders():
+    """Names of the decoder engines usable on this machine"""
+    return [name for name in DECODERS if name != 'pyzbar' or decode is not None]
+
+
+def get_decoder(name=None):
+    """Create a decoder engine by name; defaults to the first available one"""
+    name = name or available_decoders()[0]
+    if name not in available_decoders():
+        raise Exception(f"Decoder engine '{name}' is not available")
+    return DECODERS[name]()
+
+
+def decode_frame(gray, decoder=None, offset=(0, 0), scale=1.0):
+    """Decode every QR code in ``gray``; returns [{'data', 'polygon'}]
+
+    ``offset`` and ``scale`` map a crop's coordinates back to the full frame.
+    """
+    decoder = decoder or get_decoder()
+    codes = decoder.decode(gray)
+    if offset != (0, 0) or scale != 1.0:
+        for code in codes:
+            code['polygon'] = [(int(x / scale) + offset[0], int(y / scale) + offset[1])
+                               for x, y in code['polygon']]
+    return codes
+
+
+def calibrate(frames, engines=None):
+    """Benchmark decoder engines on ``frames`` and pick the best one
+
+    Engines are ranked by how many frames they decoded, then by mean
+    latency. Returns (best_name, {name: {'decode_rate', 'latency_ms'}}).
+    """
+    report = {}
+    for name in engines or available_decoders():
+        decoder = get_decoder(name)
+        decoded = 0
+        started = time.perf_counter()
+        for gray in frames:
+            try:
+                decoded += bool(decoder.decode(gray))
+            except Exception:
+                pass
+        elapsed = time.perf_counter() - started
+        report[name] = {
+            'decode_rate': decoded / len(frames) if frames else 0.0,
+            'latency_ms': elapsed / len(frames) * 1000 if frames else 0.0
+        }
+    best = min(report, key=lambda name: (-report[name]['decode_rate'], report[name]['latency_ms']))
+    return best, report
+
+
+def _expand(box, margin, width, height):
+    x, y, w, h = box
+    dx, dy = int(w * margin), int(h * margin)
+    x0, y0 = max(0, x - dx), max(0, y - dy)
+    x1, y1 = min(width, x + w + dx), min(height, y + h + dy)
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def _bounding_box(polygon):
+    xs = [x for x, _ in polygon]
+    ys = [y for _, y in polygon]
+    return min(xs), min(ys), max(xs) - min(xs), max(ys) - min(ys)
+
+
+def _covered(box, boxes):
+    """True if the centre of ``box`` lies inside any of ``boxes``"""
+    cx, cy = box[0] + box[2] // 2, box[1] + box[3] // 2
+    return any(x <= cx <= x + w and y <= cy <= y + h for x, y, w, h in boxes)
+
+
+def find_candidates(gray, scale=ROI_DETECT_SCALE):
+    """Bounding boxes (full-frame coordinates) of high-contrast, QR-like regions"""
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    grad_x = cv2.convertScaleAbs(cv2.Sobel(small, cv2.CV_16S, 1, 0, ksize=3))
+    grad_y = cv2.convertScaleAbs(cv2.Sobel(small, cv2.CV_16S, 0, 1, ksize=3))
+    # QR modules have strong edges in both directions
+    gradient = cv2.min(grad_x, grad_y)
+    gradient = cv2.blur(gradient, (7, 7))
+    _, mask = cv2.threshold(gradient, ROI_GRADIENT_THRESHOLD * scale, 255, cv2.THRESH_BINARY)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((9, 9), np.uint8))
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    boxes = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if min(w, h) < ROI_MIN_SIZE * scale or not 0.5 < w / h < 2.0:
+            continue
+        # A code fills most of its bounding box; scattered texture doesn't
+        if cv2.contourArea(contour) < 0.5 * w * h:
+            continue
+        boxes.append((int(x / scale), int(y / scale), int(w / scale), int(h / scale)))
+    boxes.sort(key=lambda box: box[2] * box[3], reverse=True)
+    return boxes[:ROI_MAX_CANDIDATES]
+
+
+def decode_region(gray, box, decoder, margin=ROI_MARGIN, transform=None):
+    """Decode the area around ``box``, upscaled if small and optionally transformed"""
+    height, width = gray.shape[:2]
+    x, y, w, h = _expand(box, margin, width, height)
+    if w == 0 or h == 0:
+        return []
+    crop = gray[y:y + h, x:x + w]
+    scale = 1.0
+    if max(w, h) < ROI_MIN_DECODE_SIZE:
+        scale = ROI_MIN_DECODE_SIZE / max(w, h)
+        crop = cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+    if transform is not None:
+        crop = transform(crop)
+    return decode_frame(crop, decoder, offset=(x, y), scale=scale)
+
+
+class AdaptivePreprocessor:
+    """Escalating image fixes for codes that were found but would not decode
+
+    Transforms are tried cheapest-first until one decodes, and reordered
+    by how often each has succeeded, so the fix that suits the venue's
+    lighting is tried first. Frames that decode normally never get here.
+    """
+
+    def __init__(self):
+        self._clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
+        self._detector = cv2.QRCodeDetector()
+        self.transforms = {
+            'clahe': self._clahe.apply,
+            'adaptive_threshold': lambda gray: cv2.adaptiveThreshold(
+                gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 5),
+            'sharpen': lambda gray: cv2.filter2D(gray, -1, SHARPEN_KERNEL),
+            'invert': cv2.bitwise_not
+        }
+        self._stats = {name: {'attempts': 0, 'successes': 0} for name in self.transforms}
+        self.frames = 0
+        self.recovered = 0
+
+    def order(self):
+        """Transform names, most successful first; ties keep the default order"""
+        names = list(self.transforms)
+        return sorted(names, key=lambda name: (
+            -(self._stats[name]['successes'] + 1) / (self._stats[name]['attempts'] + 2),
+            names.index(name)
+        ))
+
+    def detect(self, gray):
+        """Boxes where a code seems to be, by gradient or finder patterns"""
+        boxes = find_candidates(gray)
+        if not boxes:
+            try:
+                found, points = self._detector.detect(gray)
+            except cv2.error:
+                return []
+            if found and points is not None:
+                boxes = [_bounding_box([(int(x), int(y)) for x, y in points.reshape(-1, 2)])]
+        return boxes
+
+    def recover(self, gray, decoder, boxes=None):
+        """Try each transform on ``boxes`` (detected if None) until one decodes"""
+        boxes = self.detect(gray) if boxes is None else boxes
+        boxes = [box for box in boxes if box[2] and box[3]][:PREPROCESS_MAX_REGIONS]
+        if not boxes:
+            return []
+        self.frames += 1
+        for name in self.order():
+            codes = {}
+            for box in boxes:
+                for code in decode_region(gray, box, decoder, transform=self.transforms[name]):
+                    codes.setdefault(code['data'], code)
+            self._stats[name]['attempts'] += 1
+            if codes:
+                self._stats[name]['successes'] += 1
+                self.recovered += 1
+                return list(codes.values())
+        return []
+
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'recovered': self.recovered,
+            'transforms': {name: dict(self._stats[name]) for name in self.order()}
+        }
+
+
+class RegionDecoder:
+    """Decode only where a QR code is likely to be
+
+    Each frame decodes the regions where codes were seen in recent frames,
+    then any candidate regions from a cheap gradient pass on a downscaled
+    frame that those codes do not already cover, and every
+    ``full_frame_interval`` frames the whole frame. The results are merged,
+    so a second badge entering the frame is found while the first is still
+    tracked. Empty frames cost one small gradient pass instead of a
+    full-resolution decode.
+    """
+
+    def __init__(self, decoder=None, scale=ROI_DETECT_SCALE, track_frames=ROI_TRACK_FRAMES,
+                 full_frame_interval=ROI_FULL_FRAME_INTERVAL, margin=ROI_MARGIN, preprocessor=None):
+        self.decoder = decoder or get_decoder()
+        self.preprocessor = preprocessor
+        self.scale = scale
+        self.track_frames = track_frames
+        self.full_frame_interval = full_frame_interval
+        self.margin = margin
+        self._tracked = []
+        self._frame_count = 0
+        self.stats = {'tracked': 0, 'candidate': 0, 'full_frame': 0, 'skipped': 0}
+
+    def candidates(self, gray):
+        """Bounding boxes (full-frame coordinates) of high-contrast, QR-like regions"""
+        return find_candidates(gray, self.scale)
+
+    def _decode_box(self, gray, box):
+        return decode_region(gray, box, self.decoder, self.margin)
+
+    def _decode_boxes(self, gray, boxes):
+        codes = {}
+        for box in boxes:
+            for code in self._decode_box(gray, box):
+                codes.setdefault(code['data'], code)
+        return list(codes.values())
+
+    def decode(self, gray):
+        self._frame_count += 1
+        self._tracked = [(box, age + 1) for box, age in self._tracked if age < self.track_frames]
+        full_frame = self._frame_count % self.full_frame_interval == 0
+
+        codes = {}
+        for code in self._decode_boxes(gray, [box for box, _ in self._tracked]):
+            codes.setdefault(code['data'], code)
+        if codes:
+            self.stats['tracked'] += 1
+
+        # Regions a decoded code already covers would only decode it again
+        covered = [_bounding_box(code['polygon']) for code in codes.values() if code['polygon']]
+        undecoded = []
+        found = False
+        for box in self.candidates(gray):
+            if _covered(box, covered):
+                continue
+            region_codes = self._decode_box(gray, box)
+            for code in region_codes:
+                found = found or code['data'] not in codes
+                codes.setdefault(code['data'], code)
+            if not region_codes:
+                undecoded.append(box)
+        if found:
+            self.stats['candidate'] += 1
+
+        if full_frame:
+            for code in decode_frame(gray, self.decoder):
+                codes.setdefault(code['data'], code)
+            self.stats['full_frame'] += 1
+        elif not codes:
+            self.stats['skipped'] += 1
+
+        if self.preprocessor is not None:
+            # Something code-like is in view but would not decode as-is.
+            # Tracked boxes are not evidence on their own: the code may
+            # simply have left the frame
+            if undecoded:
+                recovered = self.preprocessor.recover(gray, self.decoder, undecoded)
+            elif full_frame and not codes:
+                # With no region to go on, look for finder patterns, but
+                # only on the periodic full-frame pass
+                recovered = self.preprocessor.recover(gray, self.decoder)
+            else:
+                recovered = []
+            for code in recovered:
+                codes.setdefault(code['data'], code)
+
+        codes = list(codes.values())
+        if codes:
+            fresh = [_bounding_box(code['polygon']) for code in codes if code['polygon']]
+            # Keep following codes that were missed this frame but not replaced
+            kept = [(box, age) for box, age in self._tracked if not _covered(box, fresh)]
+            self._tracked = [(box, 0) for box in fresh] + kept
+        return codes
+
+
+def platform_backends():
+    """Capture backends to try, in order, on this operating system"""
+    if sys.platform.startswith('linux'):
+        return [cv2.CAP_V4L2, cv2.CAP_ANY]
+    if sys.platform == 'win32':
+        return [cv2.CAP_DSHOW, cv2.CAP_MSMF, cv2.CAP_ANY]
+    if sys.platform == 'darwin':
+        return [cv2.CAP_AVFOUNDATION, cv2.CAP_ANY]
+    return [cv2.CAP_ANY]
+
+
+def _v4l2_cameras():
+    """List capture devices from /dev/video* without opening them"""
+    cameras = []
+    for path in glob.glob('/dev/video*'):
+        match = re.fullmatch(r'/dev/video(\d+)', path)
+        if not match:
+            continue
+        index = int(match.group(1))
+        sysfs = f'/sys/class/video4linux/video{index}'
+        try:
+            # Each USB camera also exposes metadata nodes; only the node
+            # with index 0 produces frames
+            with open(os.path.join(sysfs, 'index')) as f:
+                if int(f.read().strip() or 0) != 0:
+                    continue
+        except (OSError, ValueError):
+            pass
+        try:
+            with open(os.path.join(sysfs, 'name')) as f:
+                name = f.read().strip()
+        except OSError:
+            name = path
+        cameras.append({'index': index, 'name': name})
+    return sorted(cameras, key=lambda camera: camera['index'])
+
+
+def _probe_cameras(max_index=CAMERA_PROBE_COUNT):
+    """Find cameras by opening each index; no frames are read"""
+    backend = platform_backends()[0]
+    cameras = []
+    for index in range(max_index):
+        cap = None
+        try:
+            cap = cv2.VideoCapture(index, backend)
+            if cap.isOpened():
+                cameras.append({'index': index, 'name': f"Camera {index}"})
+        except Exception:
+            pass
+        finally:
+            if cap is not None:
+                cap.release()
+    return cameras
+
+
+def list_cameras():
+    """Enumerate cameras the way that is cheapest on this platform"""
+    if sys.platform.startswith('linux') and os.path.isdir('/sys/class/video4linux'):
+        return _v4l2_cameras()
+    return _probe_cameras()
+
+
+class CameraRegistry:
+    """Camera list discovered once on a background thread and then cached
+
+    Page reruns read the cached list; enumeration only runs again when
+    ``refresh`` is called.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread = None
+        self._cameras = []
+        self.scanned_at = None
+        self.last_error = None
+
+    def _scan(self):
+        try:
+            cameras = list_cameras()
+            self.last_error = None
+        except Exception as e:
+            cameras = []
+            self.last_error = str(e)
+        with self._lock:
+            self._cameras = cameras
+            self.scanned_at = time.time()
+        self._done.set()
+
+    def refresh(self):
+        """Start a new enumeration unless one is already running"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._done.clear()
+            self._thread = threading.Thread(target=self._scan, name="camera-scan", daemon=True)
+            self._thread.start()
+
+    def cameras(self, timeout=CAMERA_SCAN_WAIT):
+        """Return [{'index', 'name'}], or None while the first scan is still running"""
+        if self.scanned_at is None and self._thread is None:
+            self.refresh()
+        if not self._done.wait(timeout) and self.scanned_at is None:
+            return None
+        with self._lock:
+            return list(self._cameras)
+
+
+camera_registry = CameraRegistry()
+
+
+class FrameSource:
+    """cv2.VideoCapture stand-in that plays a file or frame directory at a fixed rate"""
+
+    def __init__(self, path, fps=None):
+        self.path = path
+        self._video = None
+        self._files = None
+        if os.path.isdir(path):
+            self._files = sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if name.lower().endswith(IMAGE_EXTENSIONS)
+            )
+            source_fps = DEFAULT_SOURCE_FPS
+        else:
+            self._video = cv2.VideoCapture(path)
+            if not self._video.isOpened():
+                raise Exception(f"Could not open video: {path}")
+            source_fps = self._video.get(cv2.CAP_PROP_FPS) or DEFAULT_SOURCE_FPS
+        self.fps = fps or source_fps
+        self.frames_read = 0
+        self.exhausted = False
+        self._next_at = None
+
+    def isOpened(self):
+        return not self.exhausted
+
+    def set(self, prop, value):
+        return False
+
+    def read(self, image=None):
+        if self.exhausted:
+            return False, None
+        # Pace like a real camera, so frame skipping behaves as it does live
+        now = time.monotonic()
+        if self._next_at is not None and now < self._next_at:
+            time.sleep(self._next_at - now)
+        self._next_at = max(now, self._next_at or now) + 1 / self.fps
+
+        if self._files is not None:
+            frame = cv2.imread(self._files[self.frames_read]) if self.frames_read < len(self._files) else None
+        else:
+            ret, frame = self._video.read()
+            frame = frame if ret else None
+        if frame is None:
+            self.exhausted = True
+            return False, None
+        self.frames_read += 1
+        if image is not None and image.shape == frame.shape:
+            # Same contract as cv2.VideoCapture.read(image): fill the caller's buffer
+            np.copyto(image, frame)
+            return True, image
+        return True, frame
+
+    def release(self):
+        if self._video is not None:
+            self._video.release()
+
+
+def open_camera(camera_index=0, backends=None):
+    """Open a camera with the first backend that works; returns None on failure"""
+    if backends is None:
+        backends = platform_backends()
+
+    for backend in backends:
+        cap = None
+        try:
+            cap = cv2.VideoCapture(camera_index, backend)
+            if cap.isOpened():
+                cap.set(cv2.CAP_PROP_FRAME_WIDTH, FRAME_WIDTH)
+                cap.set(cv2.CAP_PROP_FRAME_HEIGHT, FRAME_HEIGHT)
+                return cap
+            cap.release()
+        except Exception:
+            if cap is not None:
+                cap.release()
+    return None
+
+
+class ScannerPipeline:
+    """Capture -> decode pipeline running on its own threads
+
+    The capture thread keeps only the newest frame. The decode worker always
+    picks up the newest frame and skips any it missed, so a slow decode or a
+    slow UI never builds a backlog. Decoded codes go to a bounded queue the
+    UI drains at its own pace.
+    """
+
+    def __init__(self, cap, decoder=None, region_decoder=None, calibrate_frames=0,
+                 preprocessor=None, result_queue_size=RESULT_QUEUE_SIZE):
+        self.cap = cap
+        self.decoder = decoder or get_decoder()
+        self.region_decoder = region_decoder
+        self.preprocessor = preprocessor
+        if region_decoder is not None:
+            region_decoder.decoder = self.decoder
+            region_decoder.preprocessor = preprocessor
+        # Frames kept for the startup engine benchmark, if one was requested
+        self.calibrate_frames = calibrate_frames
+        self._calibration = [] if calibrate_frames else None
+        self._calibration_attempts = 0
+        self.engine_report = None
+        self.frames = LatestFrame()
+        self.pool = FramePool()
+        self._gray = np.empty((FRAME_HEIGHT, FRAME_WIDTH), dtype=np.uint8)
+        self.results_queue = queue.Queue(maxsize=result_queue_size)
+        self.capture_stats = StageStats()
+        self.decode_stats = StageStats()
+        self.display_stats = StageStats()
+        self.dropped_frames = 0
+        self.dropped_results = 0
+        self.read_failures = 0
+        self.decoded_frames = 0
+        self.frames_with_codes = 0
+        self._detections = []
+        self._detections_at = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        self._threads = [
+            threading.Thread(target=self._capture_loop, name="scanner-capture", daemon=True),
+            threading.Thread(target=self._decode_loop, name="scanner-decode", daemon=True)
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+        self.cap.release()
+
+    def _capture_loop(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            buffer = self.pool.next()
+            # Filled in place when the camera delivers FRAME_WIDTH x FRAME_HEIGHT
+            ret, frame = self.cap.read(buffer)
+            if not ret:
+                self.read_failures += 1
+                time.sleep(0.05)
+                continue
+            if frame.shape[1] != FRAME_WIDTH or frame.shape[0] != FRAME_HEIGHT:
+                frame = cv2.resize(frame, (FRAME_WIDTH, FRAME_HEIGHT), dst=buffer)
+            captured_at = time.monotonic()
+            self.frames.put(frame, captured_at)
+            self.capture_stats.record(captured_at - started)
+
+    def _publish(self, result):
+        try:
+            self.results_queue.put_nowait(result)
+        except queue.Full:
+            try:
+                self.results_queue.get_nowait()
+                self.dropped_results += 1
+            except queue.Empty:
+                pass
+            self.results_queue.put_nowait(result)
+
+    def _decode_loop(self):
+        seq = 0
+        while not self._stop.is_set():
+            item = self.frames.wait_newer(seq, reserve=self.pool.reserve)
+            if item is None:
+                continue
+            new_seq, frame, captured_at = item
+            # Frames that arrived while we were busy are stale; skip them
+            self.dropped_frames += max(0, new_seq - seq - 1)
+            seq = new_seq
+
+            try:
+                # Convert right away so the pooled frame goes back to capture
+                try:
+                    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self._gray)
+                finally:
+                    self.pool.release(frame)
+                if self._calibration is not None:
+                    self._collect_calibration_frame(gray)
+                if self.region_decoder is not None:
+                    detections = self.region_decoder.decode(gray)
+                else:
+                    detections = decode_frame(gray, self.decoder)
+                    if not detections and self.preprocessor is not None:
+                        # Same gating as RegionDecoder: empty frames only pay
+                        # for the downscaled gradient pass
+                        candidates = find_candidates(gray)
+                        if candidates or self.decoded_frames % PREPROCESS_INTERVAL == 0:
+                            detections = self.preprocessor.recover(gray, self.decoder, candidates or None)
+            except Exception:
+                continue
+            decoded_at = time.monotonic()
+            self.decode_stats.record(decoded_at - captured_at)
+            self.decoded_frames += 1
+            self.frames_with_codes += bool(detections)
+
+            for detection in detections:
+                self._publish({
+                    'data': detection['data'],
+                    'polygon': detection['polygon'],
+                    'captured_at': captured_at,
+                    'decoded_at': decoded_at
+                })
+            if detections:
+                for detection in detections:
+                    # Converted once here rather than on every preview frame
+                    detection['points'] = np.array(detection['polygon'], dtype=np.int32).reshape((-1, 1, 2))
+                with self._lock:
+                    self._detections = detections
+                    self._detections_at = decoded_at
+
+    def _collect_calibration_frame(self, gray):
+        self._calibration.append(gray.copy())
+        if len(self._calibration) < self.calibrate_frames:
+            return
+        best, report = calibrate(self._calibration)
+        self._calibration_attempts += 1
+        if not any(result['decode_rate'] for result in report.values()) and \
+                self._calibration_attempts < CALIBRATION_ATTEMPTS:
+            # Nobody held a code up yet, so latency alone would decide; retry
+            self._calibration = []
+            return
+        self._calibration = None
+        self.engine_report = report
+        self.decoder = get_decoder(best)
+        if self.region_decoder is not None:
+            self.region_decoder.decoder = self.decoder
+
+    @contextmanager
+    def borrow_frame(self):
+        """Yield (frame, seq) for the newest frame without copying it
+
+        The pooled buffer is held back from capture until the block exits,
+        so it must not be kept beyond it.
+        """
+        frame, _, seq = self.frames.peek(reserve=self.pool.reserve)
+        try:
+            yield frame, seq
+        finally:
+            if frame is not None:
+                self.pool.release(frame)
+
+    def results(self):
+        """Drain every decoded code waiting for the UI"""
+        drained = []
+        while True:
+            try:
+                drained.append(self.results_queue.get_nowait())
+            except queue.Empty:
+                return drained
+
+    def detections(self, max_age=DETECTION_OVERLAY_TTL):
+        """Codes decoded in the last ``max_age`` seconds, for drawing overlays"""
+        with self._lock:
+            if time.monotonic() - self._detections_at > max_age:
+                return []
+            return list(self._detections)
+
+    def record_display(self, latency):
+        self.display_stats.record(latency)
+
+    def stats(self):
+        return {
+            'capture': self.capture_stats.snapshot(),
+            'decode': self.decode_stats.snapshot(),
+            'display': self.display_stats.snapshot(),
+            'dropped_frames': self.dropped_frames,
+            'dropped_results': self.dropped_results,
+            'read_failures': self.read_failures,
+            'decoded_frames': self.decoded_frames,
+            'frames_with_codes': self.frames_with_codes,
+            'engine': self.decoder.name,
+            'calibrating': self._calibration is not None,
+            'preprocess': self.preprocessor.stats() if self.preprocessor is not None else None
+        }
+
+
+class CodeCooldown:
+    """Per-code cooldown, so one badge held in view is only accepted once"""
+
+    def __init__(self, cooldown=GATE_CODE_COOLDOWN):
+        self.cooldown = cooldown
+        self._last_seen = {}
+
+    def accept(self, results, now=None):
+        """Return the distinct codes in ``results`` that are not cooling down"""
+        now = time.monotonic() if now is None else now
+        accepted = []
+        for result in results:
+            data = result['data']
+            if not data or data in accepted:
+                continue
+            if now - self._last_seen.get(data, float('-inf')) >= self.cooldown:
+                accepted.append(data)
+            # A code still in view keeps extending its own cooldown
+            self._last_seen[data] = now
+        if len(self._last_seen) > 1000:
+            self._last_seen = {data: seen for data, seen in self._last_seen.items()
+                               if now - seen < self.cooldown}
+        return accepted
+
+
+def decode_image(name, data, engine=None):
+    """Decode every QR code in an encoded image; returns {'file', 'codes', 'error'}
+
+    Runs in a worker process, so it only takes and returns plain values.
+    """
+    try:
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            return {'file': name, 'codes': [], 'error': "Not a readable image"}
+        decoder = get_decoder(engine)
+        attempts = [image]
+        if max(image.shape[:2]) > UPLOAD_DECODE_SIZE:
+            scale = UPLOAD_DECODE_SIZE / max(image.shape[:2])
+            attempts.insert(0, cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA))
+        codes, error = [], None
+        for gray in attempts:
+            for attempt in (decode_frame, AdaptivePreprocessor().recover):
+                try:
+                    codes = attempt(gray, decoder)
+                except Exception as e:
+                    # Keep going: a preprocessed or full-size attempt may still decode
+                    error = str(e)
+                if codes:
+                    break
+            if codes:
+                break
+        return {'file': name, 'codes': sorted({code['data'] for code in codes}), 'error': None if codes else error}
+    except Exception as e:
+        return {'file': name, 'codes': [], 'error': str(e)}
+
+
+def expand_uploads(files):
+    """Yield (name, bytes) for each image, unpacking any ZIP archives among ``files``"""
+    for name, data in files:
+        if name.lower().endswith('.zip'):
+            with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                for member in archive.infolist():
+                    member_name = member.filename
+                    if member.is_dir() or member_name.startswith('__MACOSX/') or \
+                            not member_name.lower().endswith(IMAGE_EXTENSIONS):
+                        continue
+                    yield member_name, archive.read(member)
+        elif name.lower().endswith(IMAGE_EXTENSIONS):
+            yield name, data
+
+
+def decode_images(images, max_workers=None, engine=None):
+    """Decode (name, bytes) images across CPU cores, yielding results as they finish"""
+    images = list(images)
+    if not images:
+        return
+    workers = min(max_workers or os.cpu_count() or 1, len(images))
+    # Spawned, not forked: the caller may be a threaded server process
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = [pool.submit(decode_image, name, data, engine) for name, data in images]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def parse_registration(qr_data):
+    """Registration number from scanned QR data; None if the code is rejected"""
+    return read_payload(qr_data)[0]
+
+
+def draw_detections(frame, detections):
+    """Draw decoded QR outlines and the latest payload onto ``frame``"""
+    for detection in detections:
+        if len(detection['polygon']) == 4:
+            pts = detection.get('points')
+            if pts is None:
+                pts = np.array(detection['polygon'], dtype=np.int32).reshape((-1, 1, 2))
+            cv2.polylines(frame, [pts], True, (0, 255, 0), 2)
+    if detections:
+        cv2.putText(frame, f"QR: {detections[0]['data'][:20]}...",
+                    (10, 30), cv2.FONT_HERSHEY_SIMPLEX,
+                    0.7, (0, 0, 255), 2)
+    return frame
+
+
+class PreviewEncoder:
+    """Downscaled JPEG preview frames, sent at a fixed capped rate
+
+    A frame is skipped when it is not new or when the rate cap has not
+    elapsed. Streamlit gives no signal for when the browser has shown a
+    frame, so the cap is fixed rather than adapted to the client.
+    """
+
+    def __init__(self, fps=PREVIEW_FPS, quality=PREVIEW_QUALITY, width=PREVIEW_WIDTH):
+        self.interval = 1 / fps
+        self.quality = quality
+        self.width = width
+        self._next_at = 0.0
+        self._last_seq = None
+        # Reused for the overlay copy and the downscaled frame
+        self._canvas = None
+        self._small = None
+        self._sizes = deque(maxlen=30)
+        self.stats_window = StageStats()
+        self.sent = 0
+        self.skipped = 0
+
+    def encode(self, frame, seq, detections=()):
+        """Return JPEG bytes for ``frame``, or None if this frame should be skipped"""
+        if frame is None or seq == self._last_seq:
+            return None
+        started = time.monotonic()
+        if started < self._next_at:
+            self.skipped += 1
+            return None
+        self._next_at = started + self.interval
+        self._last_seq = seq
+        if self._canvas is None or self._canvas.shape != frame.shape:
+            self._canvas = np.empty_like(frame)
+        np.copyto(self._canvas, frame)
+        frame = draw_detections(self._canvas, detections)
+        if self.width and frame.shape[1] > self.width:
+            height = int(frame.shape[0] * self.width / frame.shape[1])
+            if self._small is None or self._small.shape[:2] != (height, self.width):
+                self._small = np.empty((height, self.width) + frame.shape[2:], dtype=frame.dtype)
+            frame = cv2.resize(frame, (self.width, height), dst=self._small, interpolation=cv2.INTER_LINEAR)
+        ok, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            return None
+        jpeg = jpeg.tobytes()
+        self._sizes.append(len(jpeg))
+        self.stats_window.record(time.monotonic() - started)
+        self.sent += 1
+        return jpeg
+
+    def stats(self):
+        snapshot = self.stats_window.snapshot()
+        return {
+            'fps': snapshot['fps'],
+            'kb_per_frame': sum(self._sizes) / len(self._sizes) / 1024 if self._sizes else 0.0,
+            'skipped': self.skipped
+        }
+
+
+def format_stats(stats, preview=None):
+    """One-line summary of pipeline (and optionally preview) stats for the UI"""
+    line = " | ".join(
+        f"{stage}: {stats[stage]['fps']:.0f} fps, {stats[stage]['latency_ms']:.0f} ms"
+        for stage in ('capture', 'decode', 'display')
+    ) + f" | dropped frames: {stats['dropped_frames']} | engine: {stats['engine']}" + (
+        " (calibrating)" if stats['calibrating'] else ""
+    )
+    if stats.get('preprocess'):
+        line += f" | recovered: {stats['preprocess']['recovered']}/{stats['preprocess']['frames']}"
+    if preview is not None:
+        line += f" | preview: {preview['fps']:.0f} fps, {preview['kb_per_frame']:.0f} KB/frame"
+    return line
@@ -0,0 +1,89 @@
+import os
+import threading
+import time
+from datetime import date
+
+# How often the counters are checked against the storage backend. Between
+# reconciles they are kept current by the marks and inserts made here.
+STATS_RECONCILE_INTERVAL = int(os.environ.get('STATS_RECONCILE_INTERVAL', 60))
+
+
+class AttendanceStats:
+    """Total / present / scanned-today counters shared by every page"""
+
+    def __init__(self, reconcile_interval=STATS_RECONCILE_INTERVAL):
+        self.reconcile_interval = reconcile_interval
+        self._lock = threading.Lock()
+        self._reconcile_lock = threading.Lock()
+        self._thread = None
+        self.total = 0
+        self.present = 0
+        self.scanned_today = 0
+        self.day = date.today()
+        self.reconciled_at = None
+        self.last_error = None
+
+    def _roll_day(self):
+        today = date.today()
+        if today != self.day:
+            self.day = today
+            self.scanned_today = 0
+
+    def record_insert(self, count=1):
+        with self._lock:
+            self.total += count
+
+    def record_mark(self):
+        with self._lock:
+            self._roll_day()
+            self.present += 1
+            self.scanned_today += 1
+
+    def reconcile(self):
+        """Replace the counters with what the storage backend reports"""
+        from storage import get_storage
+        with self._reconcile_lock:
+            storage = get_storage()
+            counts = storage.counts()
+            scanned_today = storage.scanned_today()
+            with self._lock:
+                self._roll_day()
+                self.total = counts['total']
+                self.present = counts['present']
+                if scanned_today is not None:
+                    self.scanned_today = scanned_today
+                self.reconciled_at = time.time()
+
+    def _run(self):
+        while True:
+            time.sleep(self.reconcile_interval)
+            try:
+                self.reconcile()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+
+    def snapshot(self):
+        """Return the current counters; only the very first call hits storage"""
+        if self.reconciled_at is None:
+            self.reconcile()
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="stats-reconcile", daemon=True)
+                self._thread.start()
+            self._roll_day()
+            return {
+                'total': self.total,
+                'present': self.present,
+                'absent': self.total - self.present,
+                'scanned_today': self.scanned_today,
+                'reconciled_at': self.reconciled_at
+            }
+
+
+attendance_stats = AttendanceStats()
+
+
+def get_stats():
+    """Return the shared attendance counters"""
+    return attendance_stats.snapshot()
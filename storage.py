@@ -0,0 +1,367 @@
+import os
+import sqlite3
+import threading
+
+from stats import attendance_stats
+
+from utils import (
+    EXPECTED_HEADERS,
+    get_google_sheet,
+    check_duplicate,
+    add_participant,
+    bulk_import,
+    queue_attendance,
+    queue_attendance_many,
+    priority_calls,
+    get_attendance_data,
+    attendance_writer,
+    registration_index,
+    normalize_registration,
+    BULK_CHUNK_SIZE
+)
+
+STORAGE_BACKEND = os.environ.get('ATTENDANCE_BACKEND', 'sheets').lower()
+SQLITE_PATH = os.environ.get('ATTENDANCE_DB', 'attendance.db')
+
+
+class StorageBackend:
+    """Operations every attendance store has to support"""
+
+    name = "base"
+
+    def get_participant(self, registration_number):
+        """Return {'Name', 'Registration_Number', 'Status'} or None"""
+        raise NotImplementedError
+
+    def add_participant(self, name, registration_number):
+        raise NotImplementedError
+
+    def bulk_insert(self, participants, progress_callback=None):
+        """Insert (name, registration_number) pairs, skipping duplicates
+
+        Returns {'added': [(name, reg)], 'duplicates': n, 'errors': n}
+        """
+        raise NotImplementedError
+
+    def mark_present(self, registration_number):
+        """Return ("marked" | "already_present" | "not_found", name)"""
+        raise NotImplementedError
+
+    def mark_present_many(self, registration_numbers):
+        """Mark several participants; returns one mark_present result per number"""
+        return [self.mark_present(registration_number) for registration_number in registration_numbers]
+
+    def list_participants(self):
+        """Return every participant as a list of record dicts"""
+        raise NotImplementedError
+
+    def refresh(self):
+        """Bring any local copy of the store up to date before a bulk operation"""
+
+    def counts(self):
+        """Return {'total', 'present', 'absent'}"""
+        raise NotImplementedError
+
+    def scanned_today(self):
+        """Return how many participants were marked today, or None if unknown"""
+        return None
+
+    def flush(self):
+        """Block until every accepted change is persisted"""
+
+    def write_stats(self):
+        """Return background write statistics, if the backend has any"""
+        return None
+
+
+class SheetsBackend(StorageBackend):
+    """Google Sheets store, using the shared connection and registration index"""
+
+    name = "sheets"
+
+    def get_participant(self, registration_number):
+        _, participant = check_duplicate(get_google_sheet(), registration_number)
+        return participant
+
+    def add_participant(self, name, registration_number):
+        add_participant(get_google_sheet(), name, registration_number)
+        attendance_stats.record_insert()
+
+    def bulk_insert(self, participants, progress_callback=None):
+        result = bulk_import(get_google_sheet(), participants, progress_callback=progress_callback)
+        attendance_stats.record_insert(len(result['added']))
+        return result
+
+    def mark_present(self, registration_number):
+        result = queue_attendance(get_google_sheet(), registration_number)
+        if result[0] == "marked":
+            attendance_stats.record_mark()
+        return result
+
+    def mark_present_many(self, registration_numbers):
+        if len(registration_numbers) == 1:
+            return [self.mark_present(registration_numbers[0])]
+        results = queue_attendance_many(get_google_sheet(), registration_numbers)
+        for result, _ in results:
+            if result == "marked":
+                attendance_stats.record_mark()
+        return results
+
+    def list_participants(self):
+        return get_attendance_data(get_google_sheet())
+
+    def refresh(self):
+        with priority_calls():
+            registration_index.refresh(get_google_sheet())
+
+    def counts(self):
+        total, present = registration_index.counts(get_google_sheet())
+        return {'total': total, 'present': present, 'absent': total - present}
+
+    def flush(self):
+        attendance_writer.flush()
+
+    def write_stats(self):
+        return attendance_writer.stats()
+
+
+class SQLiteBackend(StorageBackend):
+    """Local SQLite store with a unique index on Registration_Number"""
+
+    name = "sqlite"
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS participants (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    registration_number TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'Absent'
+                )
+            """)
+            self._conn.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_participants_registration_number
+                ON participants (registration_number)
+            """)
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(participants)")]
+            if 'marked_at' not in columns:
+                self._conn.execute("ALTER TABLE participants ADD COLUMN marked_at TEXT")
+
+    @staticmethod
+    def _record(row):
+        return dict(zip(EXPECTED_HEADERS, row))
+
+    def get_participant(self, registration_number):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT name, registration_number, status FROM participants WHERE registration_number = ?",
+                (normalize_registration(registration_number),)
+            ).fetchone()
+        return self._record(row) if row else None
+
+    def add_participant(self, name, registration_number):
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT INTO participants (name, registration_number) VALUES (?, ?)",
+                    (name, normalize_registration(registration_number))
+                )
+        except sqlite3.IntegrityError:
+            raise Exception(f"Registration number {registration_number} already exists")
+        attendance_stats.record_insert()
+
+    def bulk_insert(self, participants, progress_callback=None, chunk_size=BULK_CHUNK_SIZE):
+        rows = []
+        error_count = 0
+        for name, registration_number in participants:
+            reg_num = normalize_registration(registration_number)
+            if reg_num:
+                rows.append((str(name).strip(), reg_num))
+            else:
+                error_count += 1
+
+        added = []
+        chunks = [rows[i:i + chunk_size] for i in range(0, len(rows), chunk_size)]
+        for done, chunk in enumerate(chunks, start=1):
+            with self._lock, self._conn:
+                for name, reg_num in chunk:
+                    # The unique index rejects both existing and repeated numbers
+                    cursor = self._conn.execute(
+                        "INSERT OR IGNORE INTO participants (name, registration_number) VALUES (?, ?)",
+                        (name, reg_num)
+                    )
+                    if cursor.rowcount:
+                        added.append((name, reg_num))
+            if progress_callback:
+                progress_callback(done, len(chunks))
+
+        attendance_stats.record_insert(len(added))
+        return {
+            'added': added,
+            'duplicates': len(rows) - len(added),
+            'errors': error_count
+        }
+
+    def _mark(self, reg_num):
+        row = self._conn.execute(
+            "SELECT name, status FROM participants WHERE registration_number = ?",
+            (reg_num,)
+        ).fetchone()
+        if row is None:
+            return "not_found", None
+        name, status = row
+        if status == "Present":
+            return "already_present", name or "Unknown"
+        self._conn.execute(
+            "UPDATE participants SET status = 'Present', marked_at = datetime('now', 'localtime') "
+            "WHERE registration_number = ?",
+            (reg_num,)
+        )
+        return "marked", name or "Unknown"
+
+    def mark_present(self, registration_number):
+        return self.mark_present_many([registration_number])[0]
+
+    def mark_present_many(self, registration_numbers):
+        # One transaction for the whole list
+        with self._lock, self._conn:
+            results = [self._mark(normalize_registration(reg)) for reg in registration_numbers]
+        for result, _ in results:
+            if result == "marked":
+                attendance_stats.record_mark()
+        return results
+
+    def list_participants(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name, registration_number, status FROM participants ORDER BY id"
+            ).fetchall()
+        return [self._record(row) for row in rows]
+
+    def counts(self):
+        with self._lock:
+            total, present = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(status = 'Present'), 0) FROM participants"
+            ).fetchone()
+        return {'total': total, 'present': present, 'absent': total - present}
+
+    def scanned_today(self):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM participants WHERE date(marked_at) = date('now', 'localtime')"
+            ).fetchone()[0]
+
+    def export_to_sheet(self, worksheet=None):
+        """Overwrite the Google Sheet with the contents of this database
+
+        The rows are written first and only the leftovers below them are
+        cleared afterwards, so a failed export never leaves the sheet empty.
+        """
+        worksheet = worksheet or get_google_sheet()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name, registration_number, status FROM participants ORDER BY id"
+            ).fetchall()
+        worksheet.update('A1', [EXPECTED_HEADERS] + [list(row) for row in rows])
+        registration_index.invalidate()
+        worksheet.batch_clear([f"A{len(rows) + 2}:C"])
+        return len(rows)
+
+
+class MemoryBackend(StorageBackend):
+    """In-process store for benchmarks and offline replays; nothing is persisted"""
+
+    name = "memory"
+
+    def __init__(self, accept_unknown=False):
+        # With accept_unknown, any scanned number is registered on first sight
+        self.accept_unknown = accept_unknown
+        self._lock = threading.Lock()
+        self._participants = {}
+        self._marked_today = 0
+
+    def get_participant(self, registration_number):
+        with self._lock:
+            record = self._participants.get(normalize_registration(registration_number))
+            return dict(record) if record else None
+
+    def add_participant(self, name, registration_number):
+        reg_num = normalize_registration(registration_number)
+        with self._lock:
+            if reg_num in self._participants:
+                raise Exception(f"Registration number {registration_number} already exists")
+            self._participants[reg_num] = dict(zip(EXPECTED_HEADERS, [name, reg_num, 'Absent']))
+        attendance_stats.record_insert()
+
+    def bulk_insert(self, participants, progress_callback=None):
+        added = []
+        duplicates = errors = 0
+        with self._lock:
+            for name, registration_number in participants:
+                reg_num = normalize_registration(registration_number)
+                if not reg_num:
+                    errors += 1
+                elif reg_num in self._participants:
+                    duplicates += 1
+                else:
+                    name = str(name).strip()
+                    self._participants[reg_num] = dict(zip(EXPECTED_HEADERS, [name, reg_num, 'Absent']))
+                    added.append((name, reg_num))
+        if progress_callback:
+            progress_callback(1, 1)
+        attendance_stats.record_insert(len(added))
+        return {'added': added, 'duplicates': duplicates, 'errors': errors}
+
+    def mark_present(self, registration_number):
+        reg_num = normalize_registration(registration_number)
+        with self._lock:
+            record = self._participants.get(reg_num)
+            if record is None:
+                if not self.accept_unknown:
+                    return "not_found", None
+                record = self._participants[reg_num] = dict(zip(EXPECTED_HEADERS, ['', reg_num, 'Absent']))
+            if record['Status'] == "Present":
+                return "already_present", record['Name'] or "Unknown"
+            record['Status'] = "Present"
+            self._marked_today += 1
+        attendance_stats.record_mark()
+        return "marked", record['Name'] or "Unknown"
+
+    def list_participants(self):
+        with self._lock:
+            return [dict(record) for record in self._participants.values()]
+
+    def counts(self):
+        with self._lock:
+            total = len(self._participants)
+            present = sum(record['Status'] == "Present" for record in self._participants.values())
+        return {'total': total, 'present': present, 'absent': total - present}
+
+    def scanned_today(self):
+        return self._marked_today
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage():
+    """Return the process-wide storage backend selected by ATTENDANCE_BACKEND"""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            if STORAGE_BACKEND == 'sqlite':
+                _storage = SQLiteBackend()
+            elif STORAGE_BACKEND == 'sheets':
+                _storage = SheetsBackend()
+            elif STORAGE_BACKEND == 'memory':
+                _storage = MemoryBackend()
+            else:
+                raise Exception(f"Unknown storage backend: {STORAGE_BACKEND}")
+        return _storage
@@ -3,78 +3,837 @@ from google.oauth2.service_account import Credentials
 import base64
 import json
 import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
 
-def get_google_sheet():
-    """Initialize and return Google Sheet connection"""
+SPREADSHEET_KEY = '19tMX_CiRvB0yBjbgt_MJlLg0fY0guQ0vehJQvkSBVo8'
+WORKSHEET_NAME = 'Task1'
+EXPECTED_HEADERS = ['Name', 'Registration_Number', 'Status']
+SCOPES = [
+    'https://www.googleapis.com/auth/spreadsheets',
+    'https://www.googleapis.com/auth/drive'
+]
+
+# Rebuild the client periodically even if nothing failed, so a long-running
+# kiosk does not hold on to a stale HTTP session forever.
+CONNECTION_TTL = int(os.environ.get('SHEETS_CONNECTION_TTL', 30 * 60))
+RECONNECT_ATTEMPTS = 2
+
+# Google Sheets allows 60 read and 60 write requests per minute per user.
+# A share of the read budget is held back for attendance work so dashboard
+# refreshes can never starve a scan.
+SHEETS_READS_PER_MINUTE = int(os.environ.get('SHEETS_READS_PER_MINUTE', 60))
+SHEETS_WRITES_PER_MINUTE = int(os.environ.get('SHEETS_WRITES_PER_MINUTE', 60))
+PRIORITY_READ_RESERVE = 0.25
+API_RETRY_ATTEMPTS = 5
+API_RETRY_BASE_DELAY = 1.0
+API_RETRY_MAX_DELAY = 32.0
+# Overall time budget for one operation, shared by every retry inside it,
+# including SheetConnection.run's reconnect attempt
+API_RETRY_DEADLINE = 30.0
+
+READ_METHODS = {
+    'get', 'batch_get', 'get_values', 'get_all_values', 'get_all_records',
+    'row_values', 'col_values', 'acell', 'cell'
+}
+WRITE_METHODS = {
+    'update', 'update_cell', 'update_cells', 'batch_update', 'append_row',
+    'append_rows', 'insert_row', 'insert_rows', 'delete_rows', 'clear', 'batch_clear'
+}
+# Calls that are safe to repeat after an error. Appends, inserts and
+# deletes may have gone through server-side before the error came back,
+# so retrying them could duplicate or drop rows.
+IDEMPOTENT_METHODS = READ_METHODS | {'update', 'update_cell', 'update_cells', 'batch_update', 'clear',
+                                     'batch_clear'}
+
+_call_context = threading.local()
+
+
+@contextmanager
+def priority_calls():
+    """Let sheet reads made inside this block use the reserved read budget"""
+    previous = getattr(_call_context, 'priority', False)
+    _call_context.priority = True
+    try:
+        yield
+    finally:
+        _call_context.priority = previous
+
+
+@contextmanager
+def retry_deadline(seconds=API_RETRY_DEADLINE):
+    """Bound the retries of every sheet call in this block by one deadline
+
+    Nested blocks keep the outer, earlier deadline.
+    """
+    previous = getattr(_call_context, 'deadline', None)
+    deadline = time.monotonic() + seconds
+    _call_context.deadline = deadline if previous is None else min(previous, deadline)
     try:
+        yield
+    finally:
+        _call_context.deadline = previous
+
+
+def deadline_passed():
+    deadline = getattr(_call_context, 'deadline', None)
+    return deadline is not None and time.monotonic() >= deadline
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at ``per_minute`` tokens"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, reserve=0.0):
+        """Take one token, waiting if needed; returns True if we had to wait
+
+        ``reserve`` tokens are left in the bucket for higher-priority callers.
+        """
+        waited = False
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens - 1 >= reserve:
+                    self._tokens -= 1
+                    return waited
+                wait = (reserve + 1 - self._tokens) / self.rate
+            waited = True
+            time.sleep(wait)
+
+
+quota_stats = {'calls': 0, 'throttled': 0, 'retried': 0, 'failed': 0}
+_quota_stats_lock = threading.Lock()
+
+
+def _count(stat):
+    with _quota_stats_lock:
+        quota_stats[stat] += 1
+
+
+def get_quota_stats():
+    with _quota_stats_lock:
+        return dict(quota_stats)
+
+
+def is_retryable(error):
+    """True for HTTP 429 (quota) and 5xx responses from the Sheets API"""
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None)
+    return status == 429 or (status is not None and 500 <= status < 600)
+
+
+class QuotaWorksheet:
+    """Worksheet wrapper that meters calls against the Sheets API quotas
+
+    Reads and writes draw from separate token buckets. Idempotent calls
+    rejected with 429 or 5xx are retried with jittered exponential backoff
+    until the retry deadline; appends, inserts and deletes are tried once.
+    """
+
+    read_bucket = TokenBucket(SHEETS_READS_PER_MINUTE)
+    write_bucket = TokenBucket(SHEETS_WRITES_PER_MINUTE)
+
+    def __init__(self, worksheet):
+        self._worksheet = worksheet
+
+    def __getattr__(self, name):
+        attr = getattr(self._worksheet, name)
+        if name in READ_METHODS:
+            return self._metered(attr, is_write=False, retry=True)
+        if name in WRITE_METHODS:
+            return self._metered(attr, is_write=True, retry=name in IDEMPOTENT_METHODS)
+        return attr
+
+    def _acquire(self, is_write):
+        if is_write:
+            return self.write_bucket.acquire()
+        if getattr(_call_context, 'priority', False):
+            return self.read_bucket.acquire()
+        return self.read_bucket.acquire(reserve=self.read_bucket.capacity * PRIORITY_READ_RESERVE)
+
+    def _metered(self, method, is_write, retry):
+        def call(*args, **kwargs):
+            with retry_deadline():
+                for attempt in range(API_RETRY_ATTEMPTS):
+                    if self._acquire(is_write):
+                        _count('throttled')
+                    _count('calls')
+                    try:
+                        return method(*args, **kwargs)
+                    except Exception as e:
+                        delay = min(API_RETRY_MAX_DELAY, API_RETRY_BASE_DELAY * 2 ** attempt)
+                        delay = delay / 2 + random.uniform(0, delay / 2)
+                        if (not retry or not is_retryable(e) or attempt == API_RETRY_ATTEMPTS - 1 or
+                                time.monotonic() + delay >= _call_context.deadline):
+                            _count('failed')
+                            raise
+                        _count('retried')
+                        time.sleep(delay)
+        return call
+
+
+class SheetConnection:
+    """Process-wide Google Sheets connection shared by every page and session"""
+
+    def __init__(self, ttl=CONNECTION_TTL):
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._credentials = None
+        self._worksheet = None
+        self._connected_at = 0.0
+
+    def _load_credentials(self):
         if not os.path.exists('encoded_creds.txt'):
             raise Exception("encoded_creds.txt not found. Please add your encoded Google Service Account credentials.")
-        
+
         with open('encoded_creds.txt', 'r') as f:
             encoded_creds = f.read().strip()
-        
+
         decoded_creds = base64.b64decode(encoded_creds).decode()
         service_account_info = json.loads(decoded_creds)
-        
-        scope = [
-            'https://www.googleapis.com/auth/spreadsheets',
-            'https://www.googleapis.com/auth/drive'
-        ]
-        
-        credentials = Credentials.from_service_account_info(
+
+        return Credentials.from_service_account_info(
             service_account_info,
-            scopes=scope
+            scopes=SCOPES
         )
-        
-        gc = gspread.authorize(credentials)
-        sheet = gc.open_by_key('19tMX_CiRvB0yBjbgt_MJlLg0fY0guQ0vehJQvkSBVo8')
-        worksheet = sheet.worksheet('Task1')
-        
+
+    def _connect(self):
+        if self._credentials is None:
+            self._credentials = self._load_credentials()
+
+        # The authorized session refreshes the OAuth token on its own when it
+        # expires, so keeping the client around reuses the token until then.
+        gc = gspread.authorize(self._credentials)
+        sheet = gc.open_by_key(SPREADSHEET_KEY)
+        worksheet = QuotaWorksheet(sheet.worksheet(WORKSHEET_NAME))
+
         headers = worksheet.row_values(1)
-        expected_headers = ['Name', 'Registration_Number', 'Status']
-        
-        if not headers or headers != expected_headers:
+        if not headers or headers != EXPECTED_HEADERS:
             worksheet.clear()
-            worksheet.append_row(expected_headers)
-        
-        return worksheet
-    
-    except Exception as e:
-        raise Exception(f"Failed to connect to Google Sheets: {str(e)}")
+            worksheet.append_row(EXPECTED_HEADERS)
+
+        self._worksheet = worksheet
+        self._connected_at = time.monotonic()
+
+    def is_stale(self):
+        return self._worksheet is None or time.monotonic() - self._connected_at > self.ttl
+
+    def get(self):
+        """Return the shared worksheet, connecting only when needed"""
+        with self._lock:
+            if self.is_stale():
+                try:
+                    self._connect()
+                except Exception as e:
+                    self.invalidate()
+                    raise Exception(f"Failed to connect to Google Sheets: {str(e)}")
+            return self._worksheet
+
+    def invalidate(self):
+        """Drop the cached worksheet so the next call reconnects"""
+        with self._lock:
+            self._worksheet = None
+            self._connected_at = 0.0
+
+    def run(self, func, attempts=RECONNECT_ATTEMPTS):
+        """Call func(worksheet), reconnecting and retrying if the call fails
+
+        ``func`` must be safe to repeat. Every attempt, and every API retry
+        inside it, shares one retry deadline.
+        """
+        with retry_deadline():
+            for attempt in range(attempts):
+                worksheet = self.get()
+                try:
+                    return func(worksheet)
+                except Exception:
+                    if attempt == attempts - 1 or deadline_passed():
+                        raise
+                    # Throw away the client (and its session) and try again
+                    self.invalidate()
+
+
+connection = SheetConnection()
+
+
+def get_google_sheet():
+    """Return the shared Google Sheet connection"""
+    return connection.get()
+
+# How long the registration index is trusted before it is rebuilt from the
+# sheet, and how often a lookup miss is allowed to force an early rebuild
+# (someone may have added the participant directly in the sheet).
+INDEX_MAX_AGE = int(os.environ.get('REGISTRATION_INDEX_MAX_AGE', 5 * 60))
+INDEX_MISS_RESYNC_INTERVAL = 15
+# Pages asking for the participant list trigger a delta refresh at most
+# this often; anything newer is served from the local replica.
+REPLICA_REFRESH_INTERVAL = int(os.environ.get('REPLICA_REFRESH_INTERVAL', 5))
+# Identical sheet reads started within this many seconds of each other share
+# one request and its result.
+SINGLE_FLIGHT_WINDOW = 1.0
+# How long a status change made by this process overrides what a download
+# says, covering downloads that started before the change was written.
+LOCAL_CHANGE_TTL = 30
+
+# Write-behind settings: pending status changes are flushed as one
+# batch_update every WRITE_FLUSH_INTERVAL seconds or as soon as
+# WRITE_FLUSH_BATCH of them are waiting, whichever comes first.
+WRITE_FLUSH_INTERVAL = int(os.environ.get('ATTENDANCE_FLUSH_INTERVAL_MS', 500)) / 1000
+WRITE_FLUSH_BATCH = int(os.environ.get('ATTENDANCE_FLUSH_BATCH', 50))
+WRITE_MAX_BACKOFF = 30
+
+# Rows written per append_rows() call during a bulk import. Each chunk costs
+# one write request against the per-minute Sheets quota.
+BULK_CHUNK_SIZE = 500
+
+
+def normalize_registration(registration_number):
+    return str(registration_number).strip()
+
+
+def row_from_range(updated_range):
+    """Return the first row number of an A1 range such as 'Task1!A5:C5'"""
+    match = re.search(r'![A-Z]+(\d+)', updated_range or '')
+    return int(match.group(1)) if match else None
+
+
+class SingleFlight:
+    """Share one in-flight call, and briefly its result, between identical requests
+
+    Every session and page that asks for the same key while a call is
+    running waits for that call instead of issuing its own. Callers arriving
+    up to ``window`` seconds after it finished get the same result, so
+    remote reads scale with time rather than with the number of sessions.
+    Finished calls are dropped once their window has passed, so only keys
+    used in the last few seconds are held in memory.
+    """
+
+    def __init__(self, window=SINGLE_FLIGHT_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.call_count = 0
+        self.shared_count = 0
+
+    def do(self, key, func, window=None):
+        window = self.window if window is None else window
+        with self._lock:
+            self._evict(time.monotonic())
+            call = self._calls.get(key)
+            if call is not None and (not call['done'].is_set() or
+                                     time.monotonic() - call['finished_at'] <= window):
+                self.shared_count += 1
+                leader = False
+            else:
+                call = {'done': threading.Event(), 'result': None, 'error': None, 'finished_at': 0.0,
+                        'window': window}
+                self._calls[key] = call
+                self.call_count += 1
+                leader = True
+
+        if leader:
+            try:
+                call['result'] = func()
+            except Exception as e:
+                call['error'] = e
+            finally:
+                call['finished_at'] = time.monotonic()
+                call['done'].set()
+                if not window:
+                    with self._lock:
+                        if self._calls.get(key) is call:
+                            del self._calls[key]
+        else:
+            call['done'].wait()
+
+        if call['error'] is not None:
+            raise call['error']
+        return call['result']
+
+    def _evict(self, now):
+        for key, call in list(self._calls.items()):
+            if call['done'].is_set() and now - call['finished_at'] > call['window']:
+                del self._calls[key]
+
+
+sheet_reads = SingleFlight()
+
+
+class RegistrationIndex:
+    """Local replica of the sheet with a registration number -> row map
+
+    A full download (``sync``) happens once and then every ``max_age``
+    seconds. In between, ``refresh`` pulls only the rows added beyond the
+    known row count plus the Status column, which is a few KB even for
+    thousands of participants.
+    """
+
+    def __init__(self, max_age=INDEX_MAX_AGE, miss_resync_interval=INDEX_MISS_RESYNC_INTERVAL,
+                 refresh_interval=REPLICA_REFRESH_INTERVAL):
+        self.max_age = max_age
+        self.miss_resync_interval = miss_resync_interval
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        self._rows = []
+        self._entries = {}
+        self._synced_at = None
+        self._refreshed_at = 0.0
+        self._last_miss_resync = 0.0
+        self._local_changes = {}
+
+    def _load(self, rows):
+        """Replace the replica with ``rows`` (sheet rows 2..n)"""
+        self._rows = [(list(row) + ['', '', ''])[:3] for row in rows]
+        self._entries = {}
+        for i, row in enumerate(self._rows, start=2):
+            reg_num = normalize_registration(row[1])
+            if reg_num:
+                # Keep the first occurrence, like the old linear scan did
+                self._entries.setdefault(reg_num, i)
+        self._apply_pending()
+        self._apply_local_changes()
+
+    def _append(self, rows):
+        for row in rows:
+            row = (list(row) + ['', '', ''])[:3]
+            self._rows.append(row)
+            reg_num = normalize_registration(row[1])
+            if reg_num:
+                self._entries.setdefault(reg_num, len(self._rows) + 1)
+
+    def _apply_pending(self):
+        # Status changes still waiting in the write-behind queue are newer
+        # than what the sheet says
+        for reg_num, status in attendance_writer.pending().items():
+            row = self._entries.get(reg_num)
+            if row is not None:
+                self._rows[row - 2][2] = status
+
+    def _apply_local_changes(self):
+        # A download that was in flight (or shared) may predate status
+        # changes this process just made; keep those for a short while
+        cutoff = time.monotonic() - LOCAL_CHANGE_TTL
+        for reg_num, (changed_at, status) in list(self._local_changes.items()):
+            if changed_at < cutoff:
+                del self._local_changes[reg_num]
+            elif reg_num in self._entries:
+                self._rows[self._entries[reg_num] - 2][2] = status
+
+    def _entry(self, reg_num):
+        row = self._entries.get(reg_num)
+        if row is None:
+            return None
+        name, _, status = self._rows[row - 2]
+        return row, name, status
+
+    def sync(self, worksheet):
+        """Rebuild the replica from a single download of the sheet"""
+        # Shares a download already in flight, but never reuses a finished one
+        data = sheet_reads.do('get_all_values', worksheet.get_all_values, window=0)
+        with self._lock:
+            self._load(data[1:])
+            self._synced_at = self._refreshed_at = time.monotonic()
+
+    def refresh(self, worksheet):
+        """Pull new rows and status changes since the last sync or refresh
+
+        Registration numbers are read along with the statuses; if any row
+        no longer holds the number the replica has for it (rows deleted,
+        inserted or sorted in the sheet), the replica is rebuilt instead.
+        """
+        with self._lock:
+            stale = self._is_stale()
+            known = len(self._rows)
+        if stale:
+            self.sync(worksheet)
+            return
+
+        # Fetch without holding the lock so scans keep using the replica
+        if known:
+            new_rows, statuses = sheet_reads.do(
+                ('refresh', known),
+                lambda: worksheet.batch_get([f"A{known + 2}:C", f"B2:C{known + 1}"])
+            )
+        else:
+            new_rows, statuses = sheet_reads.do(('refresh', 0), lambda: worksheet.batch_get(["A2:C"]))[0], []
+
+        with self._lock:
+            if len(self._rows) != known:
+                # The replica moved on while we were fetching; the next
+                # refresh will pick up from the new row count
+                return
+            # The API drops trailing empty cells and rows, so pad them back out
+            cells = [(list(row) + ['', ''])[:2] for row in statuses]
+            cells += [['', '']] * (known - len(cells))
+            shifted = any(normalize_registration(reg) != normalize_registration(row[1])
+                          for row, (reg, _) in zip(self._rows, cells))
+            if not shifted:
+                for row, (_, status) in zip(self._rows, cells):
+                    row[2] = status
+                self._append(new_rows)
+                self._apply_pending()
+                self._apply_local_changes()
+                self._refreshed_at = time.monotonic()
+        if shifted:
+            self.sync(worksheet)
+
+    def invalidate(self):
+        with self._lock:
+            self._synced_at = None
+
+    def _is_stale(self):
+        return self._synced_at is None or time.monotonic() - self._synced_at > self.max_age
+
+    def _ensure_fresh(self, worksheet):
+        if self._is_stale():
+            self.sync(worksheet)
+        elif time.monotonic() - self._refreshed_at > self.refresh_interval:
+            self.refresh(worksheet)
+
+    def lookup(self, worksheet, registration_number):
+        """Return (row, name, status) for a registration number, or None"""
+        reg_num = normalize_registration(registration_number)
+        if self._is_stale():
+            self.sync(worksheet)
+        with self._lock:
+            entry = self._entry(reg_num)
+            retry = entry is None and time.monotonic() - self._last_miss_resync > self.miss_resync_interval
+            if retry:
+                self._last_miss_resync = time.monotonic()
+        if retry:
+            # The participant may have been added directly in the sheet
+            self.refresh(worksheet)
+            with self._lock:
+                entry = self._entry(reg_num)
+        return entry
+
+    def records(self, worksheet):
+        """Return every participant as a record dict, refreshing if due"""
+        self._ensure_fresh(worksheet)
+        with self._lock:
+            return [dict(zip(EXPECTED_HEADERS, row)) for row in self._rows if any(row)]
+
+    def counts(self, worksheet):
+        """Return (total, present) from the replica, refreshing if due"""
+        self._ensure_fresh(worksheet)
+        with self._lock:
+            present = sum(1 for row in self._entries.values() if self._rows[row - 2][2] == "Present")
+            return len(self._entries), present
+
+    def peek(self, registration_number):
+        """Return the cached entry without touching the sheet"""
+        with self._lock:
+            return self._entry(normalize_registration(registration_number))
+
+    def registration_numbers(self):
+        with self._lock:
+            return set(self._entries)
+
+    def set_status(self, registration_number, status):
+        reg_num = normalize_registration(registration_number)
+        with self._lock:
+            self._local_changes[reg_num] = (time.monotonic(), status)
+            row = self._entries.get(reg_num)
+            if row is not None:
+                self._rows[row - 2][2] = status
+
+    def add(self, registration_number, row, name, status):
+        with self._lock:
+            if row != len(self._rows) + 2:
+                # Unknown position, or someone else appended rows in between;
+                # rebuild on next lookup
+                self._synced_at = None
+                return
+            self._append([[name, registration_number, status]])
+
+
+registration_index = RegistrationIndex()
+
 
 def check_duplicate(worksheet, registration_number):
     """Check if registration number already exists in sheet"""
     try:
-        data = worksheet.get_all_records()
-        for row in data:
-            if str(row.get('Registration_Number', '')).strip() == str(registration_number).strip():
-                return True, row
-        return False, None
+        entry = registration_index.lookup(worksheet, registration_number)
+        if entry is None:
+            return False, None
+        _, name, status = entry
+        return True, {
+            'Name': name,
+            'Registration_Number': normalize_registration(registration_number),
+            'Status': status
+        }
     except Exception as e:
+        # Force a fresh connection on the next call
+        connection.invalidate()
+        registration_index.invalidate()
         raise Exception(f"Error checking duplicate: {str(e)}")
 
-def mark_attendance(worksheet, registration_number):
-    """Mark participant as present"""
+def add_participant(worksheet, name, registration_number, status="Absent"):
+    """Append a participant row and record it in the index"""
     try:
-        data = worksheet.get_all_values()
-
-        for i, row in enumerate(data[1:], start=2):  
-            if len(row) >= 2 and str(row[1]).strip() == str(registration_number).strip():
-                # Check if already marked as present
-                if len(row) >= 3 and row[2] == "Present":
-                    return "already_present", row[0] if len(row) > 0 else "Unknown"
-                
-                # Update status to Present
-                worksheet.update_cell(i, 3, 'Present')
-                return "marked", row[0] if len(row) > 0 else "Unknown"
-        
-        return "not_found", None
+        response = worksheet.append_row([name, registration_number, status])
+        row = row_from_range(response.get('updates', {}).get('updatedRange'))
+        registration_index.add(registration_number, row, name, status)
     except Exception as e:
+        connection.invalidate()
+        registration_index.invalidate()
+        raise Exception(f"Error adding participant: {str(e)}")
+
+def bulk_import(worksheet, participants, chunk_size=BULK_CHUNK_SIZE, progress_callback=None):
+    """Add many (name, registration_number) pairs with one read and batched writes
+
+    Duplicates are skipped whether they already exist in the sheet or repeat
+    within ``participants``. ``progress_callback(chunks_done, total_chunks)``
+    is called after each chunk is written.
+    """
+    try:
+        registration_index.sync(worksheet)
+    except Exception as e:
+        connection.invalidate()
+        raise Exception(f"Error reading existing participants: {str(e)}")
+
+    seen = registration_index.registration_numbers()
+    new_rows = []
+    duplicate_count = 0
+    error_count = 0
+    for name, registration_number in participants:
+        reg_num = normalize_registration(registration_number)
+        if not reg_num:
+            error_count += 1
+        elif reg_num in seen:
+            duplicate_count += 1
+        else:
+            seen.add(reg_num)
+            new_rows.append([str(name).strip(), reg_num, "Absent"])
+
+    added = []
+    chunks = [new_rows[i:i + chunk_size] for i in range(0, len(new_rows), chunk_size)]
+    for done, chunk in enumerate(chunks, start=1):
+        try:
+            response = worksheet.append_rows(chunk)
+            first_row = row_from_range(response.get('updates', {}).get('updatedRange'))
+            for offset, (name, reg_num, status) in enumerate(chunk):
+                row = first_row + offset if first_row is not None else None
+                registration_index.add(reg_num, row, name, status)
+            added.extend((name, reg_num) for name, reg_num, _ in chunk)
+        except Exception:
+            connection.invalidate()
+            registration_index.invalidate()
+            error_count += len(chunk)
+        if progress_callback:
+            progress_callback(done, len(chunks))
+
+    return {
+        'added': added,
+        'duplicates': duplicate_count,
+        'errors': error_count
+    }
+
+class AttendanceWriter:
+    """Background writer that coalesces status changes into batch updates"""
+
+    def __init__(self, flush_interval=WRITE_FLUSH_INTERVAL, max_batch=WRITE_FLUSH_BATCH,
+                 max_backoff=WRITE_MAX_BACKOFF):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pending = {}
+        self._in_flight = {}
+        self._thread = None
+        self.flushed_count = 0
+        self.failed_flushes = 0
+        self.last_flush_latency = None
+        self.last_error = None
+
+    def submit(self, registration_number, status):
+        """Queue a status change; later changes for the same participant win"""
+        self.submit_many({registration_number: status})
+
+    def submit_many(self, changes):
+        """Queue {registration_number: status} together, so one flush writes them all"""
+        if not changes:
+            return
+        with self._lock:
+            for registration_number, status in changes.items():
+                self._pending[normalize_registration(registration_number)] = status
+            depth = len(self._pending)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="attendance-writer", daemon=True)
+                self._thread.start()
+        if depth >= self.max_batch:
+            self._wakeup.set()
+
+    def pending(self):
+        """Return every status change not yet confirmed by the sheet"""
+        with self._lock:
+            return {**self._in_flight, **self._pending}
+
+    def queue_depth(self):
+        with self._lock:
+            return len(self._pending)
+
+    def stats(self):
+        return {
+            'queue_depth': self.queue_depth(),
+            'flushed': self.flushed_count,
+            'failed_flushes': self.failed_flushes,
+            'last_flush_latency': self.last_flush_latency,
+            'last_error': self.last_error
+        }
+
+    def _requeue(self, batch):
+        with self._lock:
+            for reg_num, status in batch.items():
+                # Don't clobber a newer change submitted while we were writing
+                self._pending.setdefault(reg_num, status)
+
+    def _write(self, worksheet, batch):
+        regs = [reg for reg in batch if registration_index.peek(reg) is not None]
+        rows = [registration_index.peek(reg)[0] for reg in regs]
+        if not rows:
+            return
+
+        # One read to make sure no row moved since the index was built
+        found = worksheet.batch_get([f"B{row}" for row in rows])
+        current = [normalize_registration(cell[0][0]) if cell and cell[0] else '' for cell in found]
+        if current != regs:
+            registration_index.sync(worksheet)
+            regs = [reg for reg in batch if registration_index.peek(reg) is not None]
+            rows = [registration_index.peek(reg)[0] for reg in regs]
+            if not rows:
+                return
+
+        worksheet.batch_update([
+            {'range': f"C{row}", 'values': [[batch[reg]]]}
+            for reg, row in zip(regs, rows)
+        ])
+
+    def flush(self):
+        """Write everything pending in one batch_update; re-queues on failure"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._in_flight = batch
+            if not batch:
+                return 0
+
+            started = time.monotonic()
+            try:
+                with priority_calls():
+                    connection.run(lambda worksheet: self._write(worksheet, batch))
+            except Exception as e:
+                self._requeue(batch)
+                self.failed_flushes += 1
+                self.last_error = str(e)
+                raise
+            finally:
+                with self._lock:
+                    self._in_flight = {}
+            self.last_flush_latency = time.monotonic() - started
+            self.flushed_count += len(batch)
+            self.last_error = None
+            return len(batch)
+
+    def _run(self):
+        backoff = self.flush_interval
+        while True:
+            self._wakeup.wait(timeout=self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+                backoff = self.flush_interval
+            except Exception:
+                backoff = min(backoff * 2, self.max_backoff)
+                time.sleep(backoff)
+
+
+attendance_writer = AttendanceWriter()
+
+
+def queue_attendance(worksheet, registration_number):
+    """Mark participant as present locally and write it to the sheet in the background"""
+    try:
+        with priority_calls():
+            entry = registration_index.lookup(worksheet, registration_number)
+    except Exception as e:
+        connection.invalidate()
+        registration_index.invalidate()
         raise Exception(f"Error marking attendance: {str(e)}")
 
+    if entry is None:
+        return "not_found", None
+
+    _, name, status = entry
+    if status == "Present":
+        return "already_present", name or "Unknown"
+
+    registration_index.set_status(registration_number, 'Present')
+    attendance_writer.submit(registration_number, 'Present')
+    return "marked", name or "Unknown"
+
+def queue_attendance_many(worksheet, registration_numbers):
+    """Mark many participants present against the local replica
+
+    Numbers are resolved like queue_attendance does, so the sheet is only
+    read when the replica is stale or a miss is due a resync. All the
+    resulting marks are queued together, and the writer sends them in a
+    single batch update. A number repeated in the list comes back
+    "already_present" after its first occurrence.
+
+    Every number is resolved before any is marked, so a lookup that fails
+    partway leaves nothing marked locally without being queued.
+    """
+    entries = []
+    for registration_number in registration_numbers:
+        try:
+            with priority_calls():
+                entries.append(registration_index.lookup(worksheet, registration_number))
+        except Exception as e:
+            connection.invalidate()
+            registration_index.invalidate()
+            raise Exception(f"Error marking attendance: {str(e)}")
+
+    results = []
+    marks = {}
+    for registration_number, entry in zip(registration_numbers, entries):
+        if entry is None:
+            results.append(("not_found", None))
+            continue
+        _, name, status = entry
+        if status == "Present" or normalize_registration(registration_number) in marks:
+            results.append(("already_present", name or "Unknown"))
+            continue
+        marks[normalize_registration(registration_number)] = 'Present'
+        results.append(("marked", name or "Unknown"))
+
+    for registration_number in marks:
+        registration_index.set_status(registration_number, 'Present')
+    attendance_writer.submit_many(marks)
+    return results
+
 def get_attendance_data(worksheet):
-    """Get all attendance data"""
+    """Get all attendance data from the local replica"""
     try:
-        return worksheet.get_all_records()
+        return registration_index.records(worksheet)
     except Exception as e:
+        # Force a fresh connection on the next call
+        connection.invalidate()
+        registration_index.invalidate()
         raise Exception(f"Error getting data: {str(e)}")
\ No newline at end of file